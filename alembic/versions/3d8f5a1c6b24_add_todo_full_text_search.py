@@ -0,0 +1,114 @@
+"""add todo full-text search
+
+Revision ID: 3d8f5a1c6b24
+Revises: e91a4f0b7c3d
+Create Date: 2026-10-16 23:12:09.518342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d8f5a1c6b24'
+down_revision: Union[str, Sequence[str], None] = 'e91a4f0b7c3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+SEARCH_DOCUMENT = """
+    setweight(to_tsvector('english', coalesce({row}title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}description, '')), 'B')
+"""
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS "TodosSearch" USING fts5(
+        title, description, content='Todos', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER "Todos_search_insert" AFTER INSERT ON "Todos" BEGIN
+        INSERT INTO "TodosSearch"(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER "Todos_search_delete" AFTER DELETE ON "Todos" BEGIN
+        INSERT INTO "TodosSearch"("TodosSearch", rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER "Todos_search_update" AFTER UPDATE OF title, description ON "Todos" BEGIN
+        INSERT INTO "TodosSearch"("TodosSearch", rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO "TodosSearch"(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+
+def _is_postgres() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('Todos', sa.Column('search_vector', TSVECTOR().with_variant(sa.Text(), 'sqlite'), nullable=True))
+
+    if not _is_postgres():
+        for statement in SQLITE_DDL:
+            op.execute(statement)
+        op.execute("""INSERT INTO "TodosSearch"("TodosSearch") VALUES ('rebuild')""")
+        return
+
+    # the trigger goes in first so rows written during the backfill are indexed too
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION todos_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_DOCUMENT.format(row='NEW.')};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER todos_search_vector_update BEFORE INSERT OR UPDATE OF title, description ON "Todos"
+        FOR EACH ROW EXECUTE FUNCTION todos_search_vector_update()
+    """)
+
+    # each batch commits on its own so no lock is held for the whole table,
+    # and rows already filled are skipped if the migration is re-run
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        max_id = bind.scalar(sa.text('SELECT max(id) FROM "Todos"')) or 0
+        for start in range(0, max_id, BACKFILL_BATCH_SIZE):
+            bind.execute(
+                sa.text(f"""
+                    UPDATE "Todos" SET search_vector = {SEARCH_DOCUMENT.format(row='')}
+                    WHERE id > :start AND id <= :end AND search_vector IS NULL
+                """),
+                {'start': start, 'end': start + BACKFILL_BATCH_SIZE},
+            )
+        op.create_index('ix_Todos_search_vector', 'Todos', ['search_vector'], postgresql_using='gin',
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if not _is_postgres():
+        for trigger in ('Todos_search_update', 'Todos_search_delete', 'Todos_search_insert'):
+            op.execute(f'DROP TRIGGER IF EXISTS "{trigger}"')
+        op.execute('DROP TABLE IF EXISTS "TodosSearch"')
+        op.drop_column('Todos', 'search_vector')
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_Todos_search_vector', table_name='Todos',
+                      postgresql_concurrently=True, if_exists=True)
+    op.execute('DROP TRIGGER IF EXISTS todos_search_vector_update ON "Todos"')
+    op.execute('DROP FUNCTION IF EXISTS todos_search_vector_update()')
+    op.drop_column('Todos', 'search_vector')
@@ -0,0 +1,56 @@
+"""add todo access pattern indexes
+
+Revision ID: 4b7e2c91d0af
+Revises: 57d3a9e69494
+Create Date: 2026-10-16 20:58:41.230117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b7e2c91d0af'
+down_revision: Union[str, Sequence[str], None] = '57d3a9e69494'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _is_postgres() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _is_postgres():
+        op.create_index('ix_Todos_owner_id_id', 'Todos', ['owner_id', 'id'])
+        op.create_index('ix_Todos_owner_id_complete_priority', 'Todos', ['owner_id', 'complete', 'priority'])
+        return
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index('ix_Todos_owner_id_id', 'Todos', ['owner_id', 'id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_Todos_owner_id_complete_priority', 'Todos', ['owner_id', 'complete', 'priority'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_Todos_owner_id_incomplete', 'Todos', ['owner_id', 'priority'],
+                        postgresql_where=sa.text('complete = false'),
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if not _is_postgres():
+        op.drop_index('ix_Todos_owner_id_complete_priority', table_name='Todos')
+        op.drop_index('ix_Todos_owner_id_id', table_name='Todos')
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_Todos_owner_id_incomplete', table_name='Todos',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_Todos_owner_id_complete_priority', table_name='Todos',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_Todos_owner_id_id', table_name='Todos',
+                      postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,29 @@
+"""rename tables to uppercase
+
+Revision ID: 57d3a9e69494
+Revises: 9ccda807db8f
+Create Date: 2025-09-06 16:02:11.412398
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '57d3a9e69494'
+down_revision: Union[str, Sequence[str], None] = '9ccda807db8f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The tables are created as "Users" and "Todos" by the models, nothing to rename.
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass
@@ -0,0 +1,40 @@
+"""add RefreshTokens table
+
+Revision ID: 7a2d4e9f1b38
+Revises: 3d8f5a1c6b24
+Create Date: 2026-10-16 23:41:12.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a2d4e9f1b38'
+down_revision: Union[str, Sequence[str], None] = '3d8f5a1c6b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'RefreshTokens',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('token_hash', sa.String(64), nullable=False, unique=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('Users.id'), nullable=False),
+        sa.Column('family_id', sa.String(32), nullable=False),
+        sa.Column('expires_at', sa.Integer(), nullable=False),
+        sa.Column('revoked', sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+    op.create_index('ix_RefreshTokens_user_id', 'RefreshTokens', ['user_id'])
+    op.create_index('ix_RefreshTokens_family_id', 'RefreshTokens', ['family_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_RefreshTokens_family_id', table_name='RefreshTokens')
+    op.drop_index('ix_RefreshTokens_user_id', table_name='RefreshTokens')
+    op.drop_table('RefreshTokens')
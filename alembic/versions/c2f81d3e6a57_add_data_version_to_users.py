@@ -0,0 +1,29 @@
+"""add data_version to Users
+
+Revision ID: c2f81d3e6a57
+Revises: 4b7e2c91d0af
+Create Date: 2026-10-16 21:34:09.518263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2f81d3e6a57'
+down_revision: Union[str, Sequence[str], None] = '4b7e2c91d0af'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # constant default, so Postgres adds the column without rewriting the table
+    op.add_column('Users', sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('Users', 'data_version')
@@ -0,0 +1,49 @@
+"""add TodoStats table
+
+Revision ID: e91a4f0b7c3d
+Revises: c2f81d3e6a57
+Create Date: 2026-10-16 22:05:37.804411
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e91a4f0b7c3d'
+down_revision: Union[str, Sequence[str], None] = 'c2f81d3e6a57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    counters = [sa.Column(name, sa.Integer(), nullable=False, server_default='0')
+                for name in ['total', 'completed'] + [f'priority_{priority}' for priority in range(1, 6)]]
+    op.create_table(
+        'TodoStats',
+        sa.Column('owner_id', sa.Integer(), sa.ForeignKey('Users.id'), primary_key=True),
+        *counters,
+    )
+    # backfill from the existing todos
+    op.execute("""
+        INSERT INTO "TodoStats" (owner_id, total, completed, priority_1, priority_2, priority_3, priority_4, priority_5)
+        SELECT owner_id,
+               COUNT(*),
+               SUM(CASE WHEN complete THEN 1 ELSE 0 END),
+               SUM(CASE WHEN priority = 1 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN priority = 2 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN priority = 3 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN priority = 4 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN priority = 5 THEN 1 ELSE 0 END)
+        FROM "Todos"
+        WHERE owner_id IS NOT NULL
+        GROUP BY owner_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('TodoStats')
@@ -0,0 +1,131 @@
+"""
+Fingerprinted, precompressed static assets.
+
+``build`` copies every file under static/ to static/dist/ with a content
+hash in its name (``js/app.3f2a9c1d04e7.js``) and writes ``.gz`` and, when
+the ``brotli`` package is installed, ``.br`` variants next to it. A changed
+file gets a new name, so the copies can be cached by browsers forever;
+``AssetFiles`` serves them with ``Cache-Control: immutable`` and picks the
+smallest variant the client accepts.
+
+Builds run on startup and only write what is missing. Run
+``python assets.py`` to build ahead of time, e.g. in the deploy image.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from typing import Callable, Optional
+
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+
+from compression import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # optional, gzip alone still works
+    brotli = None
+
+STATIC_DIR = 'static'
+BUILD_DIR = os.path.join(STATIC_DIR, 'dist')
+URL_PREFIX = '/assets/'
+MANIFEST_NAME = 'manifest.json'
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+#file types worth compressing, images and fonts are compressed already
+COMPRESSIBLE_SUFFIXES = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+
+#name -> hashed name of the build being served, set by main.py
+manifest: dict = {}
+
+
+def _write(path: str, render: Callable[[], bytes]):
+    # names are content hashes, so an existing file is already right and isn't compressed again
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write then rename, so concurrently starting workers never serve a partial file
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(render())
+    os.replace(temporary, path)
+
+
+def _hashed_name(name: str, data: bytes) -> str:
+    root, extension = os.path.splitext(name)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+
+
+def build(source_dir: str = STATIC_DIR, output_dir: str = BUILD_DIR) -> dict:
+    """Fingerprint and precompress every asset, returns {name: hashed name}."""
+    built = {}
+    output_root = os.path.abspath(output_dir)
+    for directory, subdirectories, files in os.walk(source_dir):
+        # never fingerprint the build output itself
+        subdirectories[:] = sorted(subdirectory for subdirectory in subdirectories
+                                   if os.path.abspath(os.path.join(directory, subdirectory)) != output_root)
+        for file_name in sorted(files):
+            source = os.path.join(directory, file_name)
+            name = os.path.relpath(source, source_dir).replace(os.sep, '/')
+            with open(source, 'rb') as file:
+                data = file.read()
+
+            hashed = _hashed_name(name, data)
+            target = os.path.join(output_dir, hashed)
+            _write(target, lambda: data)
+            if name.endswith(COMPRESSIBLE_SUFFIXES):
+                # mtime=0 keeps the .gz bytes identical across builds
+                _write(f'{target}.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    _write(f'{target}.br', lambda: brotli.compress(data, quality=11))
+            built[name] = hashed
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    temporary = f'{manifest_path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(built, file, indent=2, sort_keys=True)
+    os.replace(temporary, manifest_path)
+    return built
+
+
+def asset_url(name: str) -> str:
+    """URL of the fingerprinted copy, or the plain /static/ URL if it hasn't been built."""
+    hashed = manifest.get(name)
+    return URL_PREFIX + hashed if hashed else f'/{STATIC_DIR}/{name}'
+
+
+class AssetFiles(StaticFiles):
+    """Serves the build directory with immutable caching and precompressed variants."""
+
+    async def get_response(self, path: str, scope):
+        accepted = accepted_encodings(Headers(scope=scope).get('accept-encoding', ''))
+        encoding: Optional[str] = None
+        for coding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if coding in accepted and self.lookup_path(path + suffix)[1] is not None:
+                encoding = coding
+                path_served = path + suffix
+                break
+        else:
+            path_served = path
+        response = await super().get_response(path_served, scope)
+
+        if response.status_code in (200, 304):
+            response.headers['Cache-Control'] = CACHE_CONTROL
+            response.headers['Vary'] = 'Accept-Encoding'
+            if encoding is not None:
+                response.headers['Content-Encoding'] = encoding
+                # the type of the original file, not application/gzip
+                media_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+                if media_type.startswith('text/'):
+                    media_type += '; charset=utf-8'
+                response.headers['Content-Type'] = media_type
+        return response
+
+
+if __name__ == '__main__':
+    built = build()
+    print(f'Built {len(built)} assets into {BUILD_DIR}')
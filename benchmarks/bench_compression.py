@@ -0,0 +1,53 @@
+"""
+CPU cost against bytes saved when compressing todo list responses.
+
+For JSON lists of several sizes, prints the compressed size and the time
+one compression takes for each gzip level and brotli quality, to pick the
+COMPRESSION_* defaults.
+
+    python benchmarks/bench_compression.py [rounds]
+"""
+
+import gzip
+import sys
+import timeit
+
+import orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SIZES = (1, 10, 100, 1000, 10_000)
+
+
+def make_payload(items: int) -> bytes:
+    return orjson.dumps([{'id': i, 'title': f'Todo {i}', 'description': f'Description of todo number {i}',
+                          'priority': i % 5 + 1, 'complete': i % 3 == 0, 'owner_id': i % 50 + 1}
+                         for i in range(1, items + 1)])
+
+
+def compressors():
+    for level in (1, 6, 9):
+        yield f'gzip-{level}', lambda data, level=level: gzip.compress(data, compresslevel=level, mtime=0)
+    if brotli is not None:
+        for quality in (1, 4, 6, 11):
+            yield f'br-{quality}', lambda data, quality=quality: brotli.compress(data, quality=quality)
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f'{"items":>6} {"bytes":>9} {"codec":>8} {"out bytes":>10} {"saved":>6} {"ms":>8} {"MB/s":>7}')
+    for items in SIZES:
+        payload = make_payload(items)
+        for name, compress in compressors():
+            number = max(1, 200_000 // len(payload))
+            seconds = min(timeit.repeat(lambda: compress(payload), number=number, repeat=rounds)) / number
+            size = len(compress(payload))
+            print(f'{items:>6} {len(payload):>9} {name:>8} {size:>10} {1 - size / len(payload):>6.0%} '
+                  f'{seconds * 1000:>8.3f} {len(payload) / seconds / 1e6:>7.1f}')
+
+
+if __name__ == '__main__':
+    main()
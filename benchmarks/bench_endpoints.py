@@ -0,0 +1,427 @@
+"""
+Throughput and latency of every endpoint under concurrent clients.
+
+Seed a database first (benchmarks/seed.py), then run the scenarios against
+it. Without --url a uvicorn server is started on the seeded database with
+login throttling relaxed; with --url an already running server is used.
+Each scenario runs --concurrency clients for --duration seconds and reports
+requests/s and p50/p95/p99 latency. A started server's cold start time, from
+launching uvicorn to the first answered request, is printed and saved too.
+
+--save writes the results as a baseline; --baseline compares against one and
+exits with status 1 when a scenario's p95 grew, or its throughput fell, by
+more than --threshold.
+
+    python benchmarks/seed.py --users 1000 --todos 1000
+    python benchmarks/bench_endpoints.py --save benchmarks/baseline.json
+    python benchmarks/bench_endpoints.py --baseline benchmarks/baseline.json --only todos.list todos.get
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from seed import DEFAULT_DATABASE_URL, PASSWORD, WORDS  # noqa: E402
+
+
+@dataclass
+class Account:
+    username: str
+    user_id: int
+    headers: dict
+    refresh_token: str
+    todo_ids: list
+    refresh_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+@dataclass
+class Context:
+    client: httpx.AsyncClient
+    rng: random.Random
+    accounts: list
+    admin: Account
+
+    def account(self) -> Account:
+        return self.rng.choice(self.accounts)
+
+    def todo_body(self) -> dict:
+        words = self.rng.sample(WORDS, 3)
+        return {'title': ' '.join(words[:2]).capitalize(), 'description': ' '.join(words),
+                'priority': self.rng.randint(1, 5)}
+
+    async def created_todo(self, account: Account) -> int:
+        # deletes need a todo of their own; making one is setup and isn't timed
+        response = await self.client.post('/todos/', json=self.todo_body(), headers=account.headers)
+        return response.json()['todo']['id']
+
+
+#name -> (scenario, stream). A scenario builds one request, doing any untimed setup first,
+#and only sending it is timed; scenarios that must see the response send it and return it
+SCENARIOS: dict = {}
+
+
+def scenario(name: str, stream: bool = False):
+    def register(func):
+        SCENARIOS[name] = (func, stream)
+        return func
+    return register
+
+
+@scenario('main.healthy')
+async def _healthy(ctx):
+    return ctx.client.build_request('GET', '/healthy')
+
+
+@scenario('main.index')
+async def _index(ctx):
+    return ctx.client.build_request('GET', '/')
+
+
+@scenario('auth.login')
+async def _login(ctx):
+    return ctx.client.build_request('POST', '/auth/token',
+                                    data={'username': ctx.account().username, 'password': PASSWORD})
+
+
+@scenario('auth.register')
+async def _register(ctx):
+    username = f'benchnew-{uuid.uuid4().hex[:12]}'
+    return ctx.client.build_request('POST', '/auth/new-user', json={
+        'email': f'{username}@example.com', 'username': username, 'first_name': 'Bench', 'last_name': 'New',
+        'password': PASSWORD, 'role': 'user', 'phone_number': '0000000000'})
+
+
+@scenario('auth.refresh')
+async def _refresh(ctx):
+    account = ctx.account()
+    # rotation makes each refresh token single use, so one refresh per account at a time
+    async with account.refresh_lock:
+        response = await ctx.client.post('/auth/refresh', json={'refresh_token': account.refresh_token})
+    if response.status_code == 200:
+        account.refresh_token = response.json()['refresh_token']
+    return response
+
+
+@scenario('auth.logout')
+async def _logout(ctx):
+    # an unknown token takes the same lookup, and keeps the accounts' real tokens usable
+    return ctx.client.build_request('POST', '/auth/logout', json={'refresh_token': uuid.uuid4().hex})
+
+
+@scenario('users.info')
+async def _user_info(ctx):
+    return ctx.client.build_request('GET', '/users/user-info', headers=ctx.account().headers)
+
+
+@scenario('users.change_phone_number')
+async def _change_phone(ctx):
+    return ctx.client.build_request('POST', '/users/change-phone-number', headers=ctx.account().headers,
+                                    params={'new_phone_number': str(ctx.rng.randint(10 ** 9, 10 ** 10 - 1))})
+
+
+@scenario('todos.list')
+async def _list(ctx):
+    return ctx.client.build_request('GET', '/todos/', headers=ctx.account().headers)
+
+
+@scenario('todos.list_filtered')
+async def _list_filtered(ctx):
+    return ctx.client.build_request('GET', '/todos/', headers=ctx.account().headers,
+                                    params={'complete': 'false', 'sort': '-priority', 'limit': 50})
+
+
+@scenario('todos.get')
+async def _get(ctx):
+    account = ctx.account()
+    return ctx.client.build_request('GET', f'/todos/{ctx.rng.choice(account.todo_ids)}', headers=account.headers)
+
+
+@scenario('todos.stats')
+async def _stats(ctx):
+    return ctx.client.build_request('GET', '/todos/stats', headers=ctx.account().headers)
+
+
+@scenario('todos.search')
+async def _search(ctx):
+    return ctx.client.build_request('GET', '/todos/search', headers=ctx.account().headers,
+                                    params={'q': ctx.rng.choice(WORDS)})
+
+
+@scenario('todos.create')
+async def _create(ctx):
+    return ctx.client.build_request('POST', '/todos/', json=ctx.todo_body(), headers=ctx.account().headers)
+
+
+@scenario('todos.update')
+async def _update(ctx):
+    account = ctx.account()
+    return ctx.client.build_request('PUT', f'/todos/{ctx.rng.choice(account.todo_ids)}', headers=account.headers,
+                                    json={**ctx.todo_body(), 'complete': ctx.rng.random() < 0.5})
+
+
+@scenario('todos.patch')
+async def _patch(ctx):
+    account = ctx.account()
+    return ctx.client.build_request('PATCH', f'/todos/{ctx.rng.choice(account.todo_ids)}', headers=account.headers,
+                                    json={'complete': ctx.rng.random() < 0.5})
+
+
+@scenario('todos.delete')
+async def _delete(ctx):
+    account = ctx.account()
+    return ctx.client.build_request('DELETE', f'/todos/{await ctx.created_todo(account)}', headers=account.headers)
+
+
+@scenario('todos.batch_create')
+async def _batch_create(ctx):
+    return ctx.client.build_request('POST', '/todos/batch', headers=ctx.account().headers,
+                                    json=[ctx.todo_body() for _ in range(50)])
+
+
+@scenario('todos.batch_update')
+async def _batch_update(ctx):
+    account = ctx.account()
+    ids = ctx.rng.sample(account.todo_ids, min(50, len(account.todo_ids)))
+    return ctx.client.build_request('PUT', '/todos/batch', headers=account.headers,
+                                    json=[{**ctx.todo_body(), 'id': todo_id, 'complete': False} for todo_id in ids])
+
+
+@scenario('todos.batch_delete')
+async def _batch_delete(ctx):
+    account = ctx.account()
+    ids = [await ctx.created_todo(account) for _ in range(10)]
+    return ctx.client.build_request('DELETE', '/todos/batch', headers=account.headers, json={'ids': ids})
+
+
+@scenario('events.connect', stream=True)
+async def _events(ctx):
+    return ctx.client.build_request('GET', '/events/todos', headers=ctx.account().headers)
+
+
+@scenario('admin.todos')
+async def _admin_todos(ctx):
+    owner = ctx.account()
+    return ctx.client.build_request('GET', '/admin/todos', headers=ctx.admin.headers,
+                                    params={'owner_id': owner.user_id})
+
+
+@scenario('admin.todos_ndjson')
+async def _admin_export(ctx):
+    return ctx.client.build_request('GET', '/admin/todos', headers=ctx.admin.headers,
+                                    params={'format': 'ndjson', 'owner_id': ctx.account().user_id})
+
+
+@scenario('admin.stats')
+async def _admin_stats(ctx):
+    return ctx.client.build_request('GET', '/admin/stats', headers=ctx.admin.headers)
+
+
+@scenario('admin.pool_stats')
+async def _admin_pool_stats(ctx):
+    return ctx.client.build_request('GET', '/admin/pool-stats', headers=ctx.admin.headers)
+
+
+@scenario('admin.cache_stats')
+async def _admin_cache_stats(ctx):
+    return ctx.client.build_request('GET', '/admin/cache-stats', headers=ctx.admin.headers)
+
+
+@scenario('admin.delete_todo')
+async def _admin_delete(ctx):
+    todo_id = await ctx.created_todo(ctx.account())
+    return ctx.client.build_request('DELETE', f'/admin/todos/{todo_id}', headers=ctx.admin.headers)
+
+
+# last: it revokes the account's refresh tokens (the password stays the same)
+@scenario('users.change_password')
+async def _change_password(ctx):
+    return ctx.client.build_request('POST', '/users/change-password', headers=ctx.account().headers,
+                                    params={'old_password': PASSWORD, 'new_password': PASSWORD})
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def run_scenario(ctx: Context, name: str, concurrency: int, duration: float) -> dict:
+    build, stream = SCENARIOS[name]
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            request = await build(ctx)
+            started = time.perf_counter()
+            if isinstance(request, httpx.Response):
+                # the scenario had to send it itself (auth.refresh)
+                response, elapsed = request, request.elapsed.total_seconds()
+            else:
+                response = await ctx.client.send(request, stream=stream)
+                if not stream:
+                    await response.aread()
+                elapsed = time.perf_counter() - started
+                await response.aclose()
+            latencies.append(elapsed)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {'requests': len(latencies), 'errors': errors, 'rps': len(latencies) / wall,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000}
+
+
+async def login(client: httpx.AsyncClient, username: str) -> Account:
+    for _ in range(10):
+        response = await client.post('/auth/token', data={'username': username, 'password': PASSWORD})
+        # the password pool sheds load with 503/429, wait as told and try again
+        if response.status_code not in (429, 503):
+            break
+        await asyncio.sleep(float(response.headers.get('Retry-After', '1')))
+    if response.status_code != 200:
+        raise SystemExit(f'Login as {username} failed ({response.status_code}), was the database seeded?')
+    tokens = response.json()
+    headers = {'Authorization': f'Bearer {tokens["access_token"]}'}
+    todos = (await client.get('/todos/', params={'limit': 500}, headers=headers)).json()
+    info = (await client.get('/users/user-info', headers=headers)).json()
+    return Account(username, info['ID'], headers, tokens['refresh_token'], [todo['id'] for todo in todos])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database_url: str, workers: int) -> tuple:
+    port = _free_port()
+    env = {**os.environ, 'DATABASE_URL': database_url, 'SECRET_KEY': os.getenv('SECRET_KEY', 'benchmark'),
+           'LOGIN_IP_RATE': '1000000', 'LOGIN_IP_BURST': '1000000',
+           'LOGIN_USERNAME_RATE': '1000000', 'LOGIN_USERNAME_BURST': '1000000'}
+    env.pop('TESTING', None)
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port),
+                                '--workers', str(workers), '--log-level', 'warning'], cwd=ROOT, env=env)
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(3000):
+        try:
+            if httpx.get(f'{url}/healthy').status_code == 200:
+                # from launching the process to the first answered request: imports, lifespan, bind
+                return process, url, time.perf_counter() - started
+        except httpx.TransportError:
+            pass
+        if process.poll() is not None:
+            raise SystemExit('The server exited during startup')
+        time.sleep(0.01)
+    process.terminate()
+    raise SystemExit('The server did not start within 30 s')
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            regressions.append(f'{name}: p95 {base["p95_ms"]:.1f} -> {result["p95_ms"]:.1f} ms')
+        if result['rps'] < base['rps'] * (1 - threshold):
+            regressions.append(f'{name}: throughput {base["rps"]:.0f} -> {result["rps"]:.0f} req/s')
+    return regressions
+
+
+async def run(args, url: str) -> dict:
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        usernames = [f'bench{number}' for number in rng.sample(range(1, args.seeded_users + 1), args.accounts)]
+        # one at a time, bcrypt is slow and concurrent logins would only queue on the password pool
+        accounts = [await login(client, username) for username in usernames]
+        admin = await login(client, 'benchadmin')
+        ctx = Context(client, rng, [account for account in accounts if account.todo_ids], admin)
+        if not ctx.accounts:
+            raise SystemExit('The benchmark accounts have no todos, seed with --todos > 0')
+
+        names = [name for name in SCENARIOS if not args.only or name in args.only]
+        results = {}
+        print(f'{"scenario":<26} {"requests":>9} {"errors":>7} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+        for name in names:
+            result = results[name] = await run_scenario(ctx, name, args.concurrency, args.duration)
+            print(f'{name:<26} {result["requests"]:>9} {result["errors"]:>7} {result["rps"]:>9.1f} '
+                  f'{result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} {result["p99_ms"]:>8.2f}')
+        return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='benchmark a running server instead of starting one')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL', DEFAULT_DATABASE_URL))
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn workers of the started server')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5, help='seconds per scenario')
+    parser.add_argument('--accounts', type=int, default=20, help='seeded users to log in as')
+    parser.add_argument('--seeded-users', type=int, default=1000, help='the --users given to seed.py')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', nargs='+', metavar='SCENARIO', choices=list(SCENARIOS))
+    parser.add_argument('--save', metavar='PATH', help='write the results as a baseline')
+    parser.add_argument('--baseline', metavar='PATH', help='fail on regressions against this baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed regression, 0.2 = 20%%')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    process: Optional[subprocess.Popen] = None
+    startup_seconds: Optional[float] = None
+    url = args.url
+    if url is None:
+        process, url, startup_seconds = start_server(args.database_url, args.workers)
+        print(f'Server started in {startup_seconds:.2f} s ({args.workers} worker{"s" if args.workers != 1 else ""})')
+    try:
+        results = asyncio.run(run(args, url))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'concurrency': args.concurrency, 'duration': args.duration, 'startup_seconds': startup_seconds,
+                       'scenarios': results},
+                      file, indent=2, sort_keys=True)
+        print(f'Saved baseline to {args.save}')
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print(f'Regressions over {args.threshold:.0%}:')
+            for regression in regressions:
+                print(f'  {regression}')
+            sys.exit(1)
+        print(f'No regressions over {args.threshold:.0%}')
+
+
+if __name__ == '__main__':
+    main()
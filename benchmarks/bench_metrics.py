@@ -0,0 +1,52 @@
+"""
+Per-request cost of MetricsMiddleware.
+
+Calls a trivial ASGI app directly and through the middleware (with and
+without Server-Timing) and prints the difference per request.
+
+    python benchmarks/bench_metrics.py [requests]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import MetricsMiddleware
+
+SCOPE = {'type': 'http', 'method': 'GET', 'path': '/todos/', 'root_path': '', 'headers': []}
+
+
+async def app(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': b'[]'})
+
+
+async def receive():
+    return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+
+async def send(message):
+    pass
+
+
+async def per_request(target, requests: int) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        await target(dict(SCOPE), receive, send)
+    return (time.perf_counter() - started) / requests
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    bare = asyncio.run(per_request(app, requests))
+    print(f'{requests} requests, bare app {bare * 1e6:.2f} us/request')
+    for name, server_timing in (('metrics', False), ('metrics + Server-Timing', True)):
+        seconds = asyncio.run(per_request(MetricsMiddleware(app, server_timing=server_timing), requests))
+        print(f'  {name:<24} +{(seconds - bare) * 1e6:.2f} us/request')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Serialization cost of a 10k-item todo list.
+
+Compares what FastAPI did before (ORM objects through ``jsonable_encoder`` and
+the stdlib ``JSONResponse``) with the current path (column-only rows validated
+into ``TodoResponse`` and rendered by ``ORJSONResponse``).
+
+    python benchmarks/bench_serialization.py [items] [rounds]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TESTING', 'true')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from models import Todos
+from routers.todos import TodoResponse
+
+
+def make_rows(items: int) -> list[dict]:
+    return [{'id': i, 'title': f'Todo {i}', 'description': f'Description of todo {i}',
+             'priority': i % 5 + 1, 'complete': i % 2 == 0, 'owner_id': 1} for i in range(1, items + 1)]
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    rows = make_rows(items)
+    orm_objects = [Todos(**row) for row in rows]
+    adapter = TypeAdapter(list[TodoResponse])
+
+    def before():
+        return JSONResponse(jsonable_encoder(orm_objects)).body
+
+    def after():
+        return ORJSONResponse(adapter.dump_python(adapter.validate_python(rows))).body
+
+    assert len(before()) > 0 and len(after()) > 0
+    results = {name: min(timeit.repeat(func, number=1, repeat=rounds)) for name, func in
+               (('jsonable_encoder + JSONResponse', before), ('response model + ORJSONResponse', after))}
+    baseline = results['jsonable_encoder + JSONResponse']
+    print(f'{items} todos, best of {rounds} rounds')
+    for name, seconds in results.items():
+        print(f'  {name:<34} {seconds * 1000:8.1f} ms  {baseline / seconds:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+In-process caches shared by the routers.
+"""
+
+import os
+import threading
+from abc import ABC, abstractmethod
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """Bounded LRU mapping with optional per-entry expiry and hit/miss counters.
+
+    Entries are dropped when the cache is full (least recently used first) or
+    once the clock reaches their ``expires_at`` timestamp.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None, clock: Callable[[], float] = time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or self._clock() < expires_at:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        if expires_at is None and self.ttl is not None:
+            expires_at = self._clock() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+class OwnerCache(ABC):
+    """Interface for caches whose entries belong to one owner (user id).
+
+    ``invalidate`` drops every entry of an owner. Entries are stored against
+    the owner's generation read *before* loading them, so a value loaded
+    while a write is in flight can never be served after that write's
+    invalidation. A shared backend (Redis, memcached) has to implement
+    ``generation``/``invalidate`` with an atomic counter visible to every
+    worker; the in-process backend only sees writes made in its own process.
+    """
+
+    @abstractmethod
+    def get(self, owner_id: int, key: Hashable) -> Any:
+        ...
+
+    @abstractmethod
+    def set(self, owner_id: int, key: Hashable, value: Any, generation: int):
+        ...
+
+    @abstractmethod
+    def generation(self, owner_id: int) -> int:
+        ...
+
+    @abstractmethod
+    def invalidate(self, owner_id: int):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+    async def read_through(self, owner_id: int, key: Hashable, load: Callable) -> Any:
+        value = self.get(owner_id, key)
+        if value is None:
+            generation = self.generation(owner_id)
+            value = await load()
+            if value is not None:
+                self.set(owner_id, key, value, generation)
+        return value
+
+
+class LocalOwnerCache(OwnerCache):
+    """In-process backend: one size/TTL bounded LRU shared by all owners."""
+
+    def __init__(self, maxsize: int, ttl: Optional[float]):
+        self._entries = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._generations: dict = {}
+
+    def get(self, owner_id, key):
+        return self._entries.get((owner_id, self._generations.get(owner_id, 0), key))
+
+    def set(self, owner_id, key, value, generation):
+        self._entries.set((owner_id, generation, key), value)
+
+    def generation(self, owner_id):
+        return self._generations.get(owner_id, 0)
+
+    def invalidate(self, owner_id):
+        # older generations become unreachable and age out of the LRU
+        self._generations[owner_id] = self._generations.get(owner_id, 0) + 1
+
+    def clear(self):
+        self._entries.clear()
+        self._generations.clear()
+
+    def stats(self):
+        return self._entries.stats()
+
+
+#per-owner todo list / todo lookups, replace with another OwnerCache to share it between workers
+todo_cache: OwnerCache = LocalOwnerCache(
+    maxsize=int(os.getenv("TODO_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TODO_CACHE_TTL", "60")),
+)
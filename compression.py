@@ -0,0 +1,190 @@
+"""
+gzip/brotli response compression.
+
+``CompressionMiddleware`` compresses responses whose Content-Type is on an
+allow-list and whose body is at least ``minimum_size`` bytes, using brotli
+when the client accepts it (and the ``brotli`` package is installed) and
+gzip otherwise. Streaming responses are compressed chunk by chunk and every
+chunk is flushed, so NDJSON/CSV exports still reach the client as they are
+produced. Responses that already carry a Content-Encoding (the precompressed
+/assets files) are passed through untouched.
+
+See benchmarks/bench_compression.py for the numbers behind the defaults.
+"""
+
+import gzip
+import zlib
+from typing import Iterable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional, gzip alone still works
+    brotli = None
+
+DEFAULT_CONTENT_TYPES = (
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'image/svg+xml',
+    'text/csv',
+    'text/css',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+)
+
+
+def accepted_encodings(header: str) -> set:
+    """Content codings listed in an Accept-Encoding header, leaving out those with q=0."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q=') and quality[2:].strip() in ('0', '0.0', '0.00', '0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class _GzipStream:
+    def __init__(self, level: int):
+        # wbits=31 writes the gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self,
+                 app: ASGIApp,
+                 minimum_size: int = 1024,
+                 gzip_level: int = 6,
+                 brotli_quality: int = 4,
+                 content_types: Iterable[str] = DEFAULT_CONTENT_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.content_types = frozenset(content_types)
+
+    def _choose_encoding(self, scope: Scope) -> Optional[str]:
+        accepted = accepted_encodings(Headers(scope=scope).get('accept-encoding', ''))
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = self._choose_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponse(self, encoding, send).run(scope, receive)
+
+
+class _CompressedResponse:
+    """Per-request state: holds back the start message until the first body chunk decides."""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start: Optional[Message] = None
+        self.stream = None
+        self.passthrough = False
+
+    async def run(self, scope: Scope, receive: Receive):
+        await self.middleware.app(scope, receive, self.handle)
+
+    def _compressible(self, message: Message) -> bool:
+        headers = Headers(raw=message['headers'])
+        if message['status'] < 200 or message['status'] in (204, 304):
+            return False
+        if 'content-encoding' in headers:
+            return False
+        content_type = headers.get('content-type', '').split(';')[0].strip().lower()
+        return content_type in self.middleware.content_types
+
+    def _start_compressing(self):
+        headers = MutableHeaders(raw=self.start['headers'])
+        headers['Content-Encoding'] = self.encoding
+        headers.add_vary_header('Accept-Encoding')
+        del headers['Content-Length']
+        # the encoded bytes differ from the identity ones, so a strong validator no longer holds
+        etag = headers.get('etag')
+        if etag and not etag.startswith('W/'):
+            headers['ETag'] = f'W/{etag}'
+
+    async def handle(self, message: Message):
+        if message['type'] == 'http.response.start':
+            self.start = message
+            self.passthrough = not self._compressible(message)
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message['type'] != 'http.response.body' or self.passthrough:
+            # messages before the start (http.response.debug from templates) are just forwarded
+            if self.start is not None and not self.passthrough and self.stream is None:
+                # e.g. http.response.pathsend, the body bypasses us so nothing is encoded
+                self.passthrough = True
+                await self.send(self.start)
+            await self.send(message)
+            return
+
+        body = message.get('body', b'')
+        more_body = message.get('more_body', False)
+
+        if self.stream is None:
+            if not more_body:
+                # the whole body is here, small ones go out as they are
+                if len(body) < self.middleware.minimum_size:
+                    await self.send(self.start)
+                    await self.send(message)
+                    return
+                self._start_compressing()
+                compressed = self._compress_whole(body)
+                MutableHeaders(raw=self.start['headers'])['Content-Length'] = str(len(compressed))
+                await self.send(self.start)
+                await self.send({'type': 'http.response.body', 'body': compressed})
+                return
+            # streaming, the total size is unknown so it is always compressed
+            self._start_compressing()
+            if self.encoding == 'br':
+                self.stream = _BrotliStream(self.middleware.brotli_quality)
+            else:
+                self.stream = _GzipStream(self.middleware.gzip_level)
+            await self.send(self.start)
+
+        data = self.stream.compress(body)
+        if not more_body:
+            data += self.stream.finish()
+        if data or not more_body:
+            await self.send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+    def _compress_whole(self, body: bytes) -> bytes:
+        if self.encoding == 'br':
+            return brotli.compress(body, quality=self.middleware.brotli_quality)
+        return gzip.compress(body, compresslevel=self.middleware.gzip_level, mtime=0)
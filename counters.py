@@ -0,0 +1,89 @@
+"""
+Materialized per-owner todo counters.
+
+TodoStats holds one row per owner with the total, completed and per-priority
+counts. Every write path applies its delta with a single upsert in the same
+transaction as the write, so /todos/stats and /admin/stats never scan Todos.
+
+Run ``python counters.py`` to rebuild the table from Todos and reconcile any
+drift (for example after rows were changed outside the API).
+"""
+
+from collections import defaultdict
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models import Todos, TodoStats
+
+PRIORITIES = range(1, 6)
+COUNTER_COLUMNS = ['total', 'completed'] + [f'priority_{priority}' for priority in PRIORITIES]
+
+# (priority, complete) of a todo as it was added or removed
+TodoKey = Tuple[int, bool]
+
+
+def _delta(added: Iterable[TodoKey], removed: Iterable[TodoKey]) -> dict:
+    delta = defaultdict(int)
+    for sign, todos in ((1, added), (-1, removed)):
+        for priority, complete in todos:
+            delta['total'] += sign
+            if complete:
+                delta['completed'] += sign
+            # legacy rows may have no or an out-of-range priority, rebuild() doesn't count those either
+            if priority in PRIORITIES:
+                delta[f'priority_{priority}'] += sign
+    return {column: value for column, value in delta.items() if value}
+
+
+async def apply_delta(db: AsyncSession, owner_id: int, added: Iterable[TodoKey] = (), removed: Iterable[TodoKey] = ()):
+    delta = _delta(added, removed)
+    if not delta:
+        return
+    dialect_insert = postgresql.insert if db.bind.dialect.name == 'postgresql' else sqlite.insert
+    table = TodoStats.__table__
+    statement = dialect_insert(table).values(owner_id=owner_id, **delta).on_conflict_do_update(
+        index_elements=[table.c.owner_id],
+        set_={column: table.c[column] + value for column, value in delta.items()},
+    )
+    await db.execute(statement)
+
+
+def stats_dict(row: Optional[TodoStats], owner_id: int) -> dict:
+    counts = {column: getattr(row, column) if row is not None else 0 for column in COUNTER_COLUMNS}
+    return {
+        'owner_id': owner_id,
+        'total': counts['total'],
+        'completed': counts['completed'],
+        'pending': counts['total'] - counts['completed'],
+        'by_priority': {str(priority): counts[f'priority_{priority}'] for priority in PRIORITIES},
+    }
+
+
+def rebuild(db: Session, owner_id: Optional[int] = None) -> int:
+    """Recompute TodoStats from Todos, for every owner or just one. Returns the rows written."""
+    aggregate = select(
+        Todos.owner_id,
+        func.count(Todos.id),
+        func.coalesce(func.sum(case((Todos.complete.is_(True), 1), else_=0)), 0),
+        *[func.coalesce(func.sum(case((Todos.priority == priority, 1), else_=0)), 0) for priority in PRIORITIES],
+    ).where(Todos.owner_id.is_not(None)).group_by(Todos.owner_id)
+    clear = delete(TodoStats)
+    if owner_id is not None:
+        aggregate = aggregate.where(Todos.owner_id == owner_id)
+        clear = clear.where(TodoStats.owner_id == owner_id)
+
+    db.execute(clear)
+    result = db.execute(insert(TodoStats).from_select(['owner_id'] + COUNTER_COLUMNS, aggregate))
+    db.commit()
+    return result.rowcount
+
+
+if __name__ == '__main__':
+    from database import SessionLocal
+
+    with SessionLocal() as session:
+        print(f'Rebuilt todo counters for {rebuild(session)} owners')
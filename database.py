@@ -1,33 +1,290 @@
-from sqlalchemy import create_engine
+from sqlalchemy import (Column, MetaData, PrimaryKeyConstraint, String, Table, create_engine, event, exc, inspect,
+                        select)
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from starlette.types import ASGIApp, Receive, Scope, Send
+import logging
 import os
-from dotenv import load_dotenv
+import time
+import metrics
+from settings import get_settings
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ["true", "1", "yes"]
+
+
+# Connection pool settings, sized per worker process
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+}
 
 # Use SQLite for testing, PostgreSQL for production
-if os.getenv("TESTING") in ["true", "1"]:
+if settings.testing:
     SQLALCHEMY_DATABASE_URL = 'sqlite:///./test_database.db'
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
         connect_args={"check_same_thread": False}
     )
+    ASYNC_DATABASE_URL = None
 else:
-    SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
+    SQLALCHEMY_DATABASE_URL = settings.database_url
     if not SQLALCHEMY_DATABASE_URL:
         raise ValueError("DATABASE_URL environment variable is required")
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, **POOL_OPTIONS)
+    ASYNC_DATABASE_URL = settings.async_database_url
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def to_async_url(url: str) -> str:
+    """Swap the sync driver in a database URL for its asyncio counterpart."""
+    scheme, sep, rest = url.partition('://')
+    dialect = scheme.split('+')[0]
+    if dialect in ('postgresql', 'postgres'):
+        return f'postgresql+asyncpg{sep}{rest}'
+    if dialect == 'sqlite':
+        return f'sqlite+aiosqlite{sep}{rest}'
+    return url
+
+
+class PoolStats:
+    """Checkout counters for the request pool, read by /admin/pool-stats."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float):
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        if seconds > self.wait_seconds_max:
+            self.wait_seconds_max = seconds
+
+
+pool_stats = PoolStats()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        finally:
+            pool_stats.record_wait(time.perf_counter() - start)
+
+
+# The request handlers run on the event loop with AsyncSession (asyncpg on Postgres,
+# aiosqlite for tests). ASYNC_DATABASE_URL overrides the driver derived from DATABASE_URL;
+# the sync engine above is kept for Alembic, scripts and test fixtures.
+ASYNC_DATABASE_URL = ASYNC_DATABASE_URL or to_async_url(SQLALCHEMY_DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=TimedQueuePool, **POOL_OPTIONS)
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+def _dispose_after_fork():
+    # a forked worker (gunicorn --preload, multiprocessing) must not reuse the parent's sockets;
+    # close=False leaves them to the parent and gives the child fresh, empty pools
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_after_fork)
+
+
+class QueryStats:
+    """Statements one request ran: count, cursor time and how often each statement text repeated."""
+
+    __slots__ = ('count', 'seconds', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: dict = {}
+
+    def repeated(self, threshold: int) -> dict:
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_MS", "200")) / 1000
+# the same statement this many times in one request is most likely a loop issuing one query per row
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar('query_stats', default=None)
+#callbacks given (method, path, stats) after every tracked request, see capture_queries
+_query_observers: list = []
+
+
+def parameter_shape(parameters) -> str:
+    """Types of bound parameters without their values, safe to log."""
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f'{len(parameters)} x {parameter_shape(parameters[0])}'
+        return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+    return type(parameters).__name__
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info['query_start'].pop()
+    metrics.add_timing('db', seconds)
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += seconds
+        stats.statements[statement] = stats.statements.get(statement, 0) + 1
+    if seconds >= SLOW_QUERY_SECONDS:
+        logger.warning('slow query (%.1f ms): %s parameters=%s',
+                       seconds * 1000, ' '.join(statement.split()), parameter_shape(parameters))
+
+
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute
+    starts = context.connection.info.get('query_start') if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+event.listen(async_engine.sync_engine, 'before_cursor_execute', _before_cursor_execute)
+event.listen(async_engine.sync_engine, 'after_cursor_execute', _after_cursor_execute)
+event.listen(async_engine.sync_engine, 'handle_error', _handle_error)
+
+
+@contextmanager
+def capture_queries():
+    """Collect the QueryStats of every request finished inside the block, for query budgets in tests.
+
+    Yields a list of ``(method, path, stats)``.
+    """
+    captured = []
+
+    def observer(method: str, path: str, stats: QueryStats):
+        captured.append((method, path, stats))
+
+    _query_observers.append(observer)
+    try:
+        yield captured
+    finally:
+        _query_observers.remove(observer)
+
+
+class QueryAccountingMiddleware:
+    """Counts each request's statements and warns when one statement repeats N+1 style."""
+
+    def __init__(self, app: ASGIApp, threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _query_stats.reset(token)
+            for statement, count in stats.repeated(self.threshold).items():
+                logger.warning('possible N+1: %s %s ran the same statement %d times: %s',
+                               scope['method'], scope['path'], count, ' '.join(statement.split()))
+            for observer in _query_observers:
+                observer(scope['method'], scope['path'], stats)
+
+
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
+#alembic head the models match; bump it with every migration, test_database checks it against alembic/versions
+SCHEMA_REVISION = '7a2d4e9f1b38'
+#schema of the app before migrations were tracked, what a table-only database is stamped with first
+BASELINE_REVISION = '57d3a9e69494'
+
+#same layout as the table alembic itself creates
+_alembic_version = Table('alembic_version', MetaData(),
+                         Column('version_num', String(32), nullable=False),
+                         PrimaryKeyConstraint('version_num', name='alembic_version_pkc'))
+
+
+def check_schema(bind=engine):
+    """Compare the database's alembic revision with SCHEMA_REVISION, once per process start.
+
+    An up-to-date database costs two small queries instead of ``create_all``
+    inspecting every table. An empty database gets its tables created and
+    stamped. Tables without a revision come from the app before migrations
+    were tracked, which ``create_all`` would not bring up to date, and any
+    other revision means migrations are missing: both stop the startup rather
+    than serve an outdated schema.
+    """
     try:
-        yield db
+        with bind.begin() as connection:
+            inspector = inspect(connection)
+            current = None
+            if inspector.has_table('alembic_version'):
+                current = connection.scalar(select(_alembic_version.c.version_num))
+            if current is None:
+                existing = set(inspector.get_table_names()) & set(Base.metadata.tables)
+                if existing:
+                    raise RuntimeError(f'Database has tables ({", ".join(sorted(existing))}) but no alembic '
+                                       f'revision; run "alembic stamp {BASELINE_REVISION} && alembic upgrade head"')
+                Base.metadata.create_all(bind=connection)
+                _alembic_version.create(connection, checkfirst=True)
+                connection.execute(_alembic_version.insert().values(version_num=SCHEMA_REVISION))
+                logger.info('created the schema at revision %s', SCHEMA_REVISION)
+            elif current != SCHEMA_REVISION:
+                raise RuntimeError(f'Database schema is at revision {current}, the code expects '
+                                   f'{SCHEMA_REVISION}; run "alembic upgrade head"')
     finally:
-        db.close()
\ No newline at end of file
+        # the sync engine only served this check, don't keep its connection open in every worker
+        bind.dispose()
+
+
+async def get_db():
+    """Session dependency shared by every router."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_pool_status() -> dict:
+    pool = async_engine.sync_engine.pool
+    return {
+        'pool_size': pool.size(),
+        'max_overflow': POOL_OPTIONS['max_overflow'],
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'checkouts': pool_stats.checkouts,
+        'timeouts': pool_stats.timeouts,
+        'wait_seconds_total': round(pool_stats.wait_seconds_total, 6),
+        'wait_seconds_max': round(pool_stats.wait_seconds_max, 6),
+    }
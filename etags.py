@@ -0,0 +1,44 @@
+"""
+Per-user data versions and weak ETags for conditional reads.
+
+Every endpoint that changes a user's todos or profile bumps
+``Users.data_version`` in the same transaction. Read endpoints derive a weak
+ETag from that version, so a matching If-None-Match can be answered with 304
+after a single primary-key read of the Users row.
+"""
+
+import hashlib
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Users
+
+
+async def bump_data_version(db: AsyncSession, user_id: int):
+    await db.execute(
+        update(Users).where(Users.id == user_id).values(data_version=Users.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def get_data_version(db: AsyncSession, user_id: int) -> Optional[int]:
+    return await db.scalar(select(Users.data_version).where(Users.id == user_id))
+
+
+def weak_etag(user_id: int, version: Optional[int], *variant) -> str:
+    digest = hashlib.sha1(repr(variant).encode()).hexdigest()[:16]
+    return f'W/"u{user_id}v{version or 0}-{digest}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Weak comparison of the request's If-None-Match against ``etag``."""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(candidate.strip().removeprefix('W/') == opaque for candidate in header.split(','))
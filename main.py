@@ -1,48 +1,109 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi import Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 import models
-from database import engine
-from routers import auth, todos, admin, users
+import assets
+import metrics
+import profiling
+from passwords import hasher
+from compression import CompressionMiddleware, DEFAULT_CONTENT_TYPES
+from database import QueryAccountingMiddleware, async_engine, check_schema
+from routers import auth, todos, admin, users, events
+from settings import get_settings
+import logging
 import os
+import time
 
-app = FastAPI()
-
-# Add CORS middleware for frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Only create tables if not in test environment
-if not os.getenv("TESTING"):
-    models.Base.metadata.create_all(bind=engine)
-
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+logger = logging.getLogger(__name__)
 
 # Setup templates
 templates = Jinja2Templates(directory="templates")
 
-@app.get('/', response_class=HTMLResponse)
 def read_root(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.TemplateResponse("index.html", {"request": request, "asset_url": assets.asset_url})
 
-@app.get('/healthy')
 def health_check():
     return {'status': 'healthy'}
 
+def show_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type='text/plain; version=0.0.4')
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Tests build their tables per test, everywhere else the schema has to match the migrations
+    if not get_settings().testing:
+        await run_in_threadpool(check_schema)
+    # fingerprinted copies of static/, only missing files are written
+    assets.manifest = await run_in_threadpool(assets.build)
+    # bcrypt workers take seconds to spawn, start them before the first login arrives
+    hasher.start()
+    logger.info('startup took %.0f ms', (time.perf_counter() - started) * 1000)
+    yield
+    hasher.shutdown()
+    await async_engine.dispose()
+
+def create_app() -> FastAPI:
+    """Build the application; startup work (schema check, assets, password workers) runs in its lifespan."""
+    # a missing SECRET_KEY fails here rather than on the first login
+    auth.signing_key()
+
+    # orjson renders the already-validated response models much faster than the stdlib encoder
+    app = FastAPI(default_response_class=metrics.TimedORJSONResponse, lifespan=lifespan)
+
+    # Add CORS middleware for frontend
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # admin-requested and randomly sampled request profiles, see profiling.py
+    app.add_middleware(profiling.ProfilerMiddleware)
+
+    # gzip/brotli for JSON, exports and pages; defaults picked with benchmarks/bench_compression.py
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024")),
+        gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+        brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4")),
+        content_types=os.getenv("COMPRESSION_CONTENT_TYPES", ",".join(DEFAULT_CONTENT_TYPES)).split(","),
+    )
+
+    # statements per request, slow-query log and N+1 warnings, see database.py
+    app.add_middleware(QueryAccountingMiddleware)
+
+    # outermost, so latency and sizes cover the other middleware too
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    # Mount static files, fingerprinted copies are served from /assets with immutable caching;
+    # the build directory is created by the lifespan, so it isn't checked here
+    app.mount("/assets", assets.AssetFiles(directory=assets.BUILD_DIR, check_dir=False), name="assets")
+    app.mount("/static", StaticFiles(directory="static"), name="static")
+
+    app.add_api_route('/', read_root, response_class=HTMLResponse)
+    app.add_api_route('/healthy', health_check)
+    app.add_api_route('/metrics', show_metrics, response_class=PlainTextResponse, include_in_schema=False)
+
+    app.include_router(admin.router)
+
+    app.include_router(users.router)
+
+    app.include_router(auth.router)
+
+    app.include_router(todos.router)
 
-app.include_router(admin.router)
+    app.include_router(events.router)
 
-app.include_router(users.router)
+    return app
 
-app.include_router(auth.router)
 
-app.include_router(todos.router)
\ No newline at end of file
+# uvicorn main:app, or uvicorn --factory main:create_app
+app = create_app()
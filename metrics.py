@@ -0,0 +1,203 @@
+"""
+Per-route request metrics in Prometheus text format.
+
+``MetricsMiddleware`` records, per method and route template, a latency
+histogram, a response size histogram, request body bytes and a counter per
+status code, plus the number of requests in flight. ``GET /metrics`` renders
+them with ``render``. Recording is a couple of dict lookups and a bisect per
+request; everything is updated on the event loop thread, so no locks.
+
+With ``METRICS_SERVER_TIMING`` on, each response also carries a
+``Server-Timing`` header splitting the time to the first response byte into
+auth (``get_current_user``), db (cursor execution, see database.py) and
+serialize (JSON rendering).
+"""
+
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "false").lower() in ["true", "1", "yes"]
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+#phase -> seconds of the current request, only set while Server-Timing is on
+_timings: ContextVar[Optional[dict]] = ContextVar('server_timings', default=None)
+
+
+def add_timing(name: str, seconds: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def timing(name: str):
+    if _timings.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(name, time.perf_counter() - start)
+
+
+class TimedORJSONResponse(ORJSONResponse):
+    """ORJSONResponse that reports its rendering time as ``serialize``."""
+
+    def render(self, content) -> bytes:
+        with timing('serialize'):
+            return super().render(content)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # counts are per bucket here and made cumulative when rendered
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouteMetrics:
+    __slots__ = ('latency', 'response_size', 'request_bytes', 'statuses')
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.request_bytes = 0
+        self.statuses: dict = {}
+
+
+class Registry:
+    def __init__(self):
+        self.routes: dict = {}
+        self.in_flight = 0
+
+    def route(self, method: str, path: str) -> RouteMetrics:
+        key = (method, path)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            metrics = self.routes[key] = RouteMetrics()
+        return metrics
+
+    def clear(self):
+        self.routes.clear()
+
+    def render(self) -> str:
+        lines = ['# HELP http_requests_in_flight Requests being handled by this worker.',
+                 '# TYPE http_requests_in_flight gauge',
+                 f'http_requests_in_flight {self.in_flight}']
+        routes = sorted(self.routes.items())
+
+        lines += ['# HELP http_requests_total Requests handled, by route and status code.',
+                  '# TYPE http_requests_total counter']
+        for (method, path), metrics in routes:
+            for code, count in sorted(metrics.statuses.items()):
+                lines.append(f'http_requests_total{{{_labels(method, path)},status="{code}"}} {count}')
+
+        for name, help_text, attribute in (
+                ('http_request_duration_seconds', 'Time until the last response byte was sent.', 'latency'),
+                ('http_response_size_bytes', 'Response body bytes as sent, after compression.', 'response_size')):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for (method, path), metrics in routes:
+                lines += _histogram_lines(name, _labels(method, path), getattr(metrics, attribute))
+
+        lines += ['# HELP http_request_size_bytes_total Request body bytes received.',
+                  '# TYPE http_request_size_bytes_total counter']
+        for (method, path), metrics in routes:
+            lines.append(f'http_request_size_bytes_total{{{_labels(method, path)}}} {metrics.request_bytes}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(method: str, path: str) -> str:
+    path = path.replace('\\', '\\\\').replace('"', '\\"')
+    return f'method="{method}",route="{path}"'
+
+
+def _histogram_lines(name: str, labels: str, histogram: Histogram) -> list:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+    return lines
+
+
+registry = Registry()
+
+
+def _route_path(scope: Scope) -> str:
+    # the router stores the matched route in the scope; mounts only leave their prefix in root_path
+    route = scope.get('route')
+    if route is not None:
+        return route.path
+    return scope.get('root_path') or '<unmatched>'
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        response_bytes = 0
+        request_bytes = 0
+        timings = {} if self.server_timing else None
+        token = _timings.set(timings) if timings is not None else None
+
+        async def receive_counted() -> Message:
+            nonlocal request_bytes
+            message = await receive()
+            request_bytes += len(message.get('body', b''))
+            return message
+
+        async def send_counted(message: Message):
+            nonlocal status_code, response_bytes
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                if timings is not None:
+                    timings['app'] = time.perf_counter() - start
+                    MutableHeaders(raw=message['headers'])['Server-Timing'] = ', '.join(
+                        f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items())
+            elif message['type'] == 'http.response.body':
+                response_bytes += len(message.get('body', b''))
+            await send(message)
+
+        registry.in_flight += 1
+        try:
+            await self.app(scope, receive_counted, send_counted)
+        finally:
+            registry.in_flight -= 1
+            if token is not None:
+                _timings.reset(token)
+            metrics = registry.route(scope['method'], _route_path(scope))
+            metrics.latency.observe(time.perf_counter() - start)
+            metrics.response_size.observe(response_bytes)
+            metrics.request_bytes += request_bytes
+            metrics.statuses[status_code] = metrics.statuses.get(status_code, 0) + 1
@@ -1,5 +1,7 @@
 from database import Base
-from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, Index, DDL, Text, event, false
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 
 class Users(Base):
     __tablename__ = 'Users'
@@ -13,6 +15,8 @@ class Users(Base):
     is_active = Column(Boolean, default=True)
     role = Column(String)
     phone_number = Column(String)
+    # bumped by every write to the user's todos or profile, feeds the ETags
+    data_version = Column(Integer, nullable=False, default=0, server_default='0')
 
 
 class Todos(Base):
@@ -23,4 +27,93 @@ class Todos(Base):
     description = Column(String)
     priority = Column(Integer)
     complete = Column(Boolean, default=False)
-    owner_id = Column(Integer, ForeignKey('Users.id'))
\ No newline at end of file
+    owner_id = Column(Integer, ForeignKey('Users.id'))
+    # full-text search document, filled by a trigger on Postgres; SQLite searches TodosSearch instead
+    search_vector = deferred(Column(TSVECTOR().with_variant(Text(), 'sqlite')))
+
+    __table_args__ = (
+        Index('ix_Todos_owner_id_id', 'owner_id', 'id'),
+        Index('ix_Todos_owner_id_complete_priority', 'owner_id', 'complete', 'priority'),
+        # partial index for the default "pending" view, Postgres only
+        Index('ix_Todos_owner_id_incomplete', 'owner_id', 'priority',
+              postgresql_where=complete == false()).ddl_if(dialect='postgresql'),
+        Index('ix_Todos_search_vector', 'search_vector', postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+
+
+#full-text search triggers for tables made by create_all, alembic revision 3d8f5a1c6b24 creates the same
+TODO_SEARCH_DDL = {
+    'postgresql': [
+        """
+        CREATE OR REPLACE FUNCTION todos_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+                                 setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER todos_search_vector_update BEFORE INSERT OR UPDATE OF title, description ON "Todos"
+        FOR EACH ROW EXECUTE FUNCTION todos_search_vector_update()
+        """,
+    ],
+    # external-content FTS5 index over Todos, kept in step by triggers
+    'sqlite': [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS "TodosSearch" USING fts5(
+            title, description, content='Todos', content_rowid='id', tokenize='porter unicode61'
+        )
+        """,
+        """
+        CREATE TRIGGER "Todos_search_insert" AFTER INSERT ON "Todos" BEGIN
+            INSERT INTO "TodosSearch"(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+        """,
+        """
+        CREATE TRIGGER "Todos_search_delete" AFTER DELETE ON "Todos" BEGIN
+            INSERT INTO "TodosSearch"("TodosSearch", rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END
+        """,
+        """
+        CREATE TRIGGER "Todos_search_update" AFTER UPDATE OF title, description ON "Todos" BEGIN
+            INSERT INTO "TodosSearch"("TodosSearch", rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO "TodosSearch"(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+        """,
+    ],
+}
+
+for _dialect, _statements in TODO_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Todos.__table__, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+event.listen(Todos.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS "TodosSearch"').execute_if(dialect='sqlite'))
+
+
+class TodoStats(Base):
+    __tablename__ = 'TodoStats'
+
+    # one row per owner, kept in step with Todos by counters.apply_delta
+    owner_id = Column(Integer, ForeignKey('Users.id'), primary_key=True)
+    total = Column(Integer, nullable=False, default=0, server_default='0')
+    completed = Column(Integer, nullable=False, default=0, server_default='0')
+    priority_1 = Column(Integer, nullable=False, default=0, server_default='0')
+    priority_2 = Column(Integer, nullable=False, default=0, server_default='0')
+    priority_3 = Column(Integer, nullable=False, default=0, server_default='0')
+    priority_4 = Column(Integer, nullable=False, default=0, server_default='0')
+    priority_5 = Column(Integer, nullable=False, default=0, server_default='0')
+
+
+class RefreshTokens(Base):
+    __tablename__ = 'RefreshTokens'
+
+    id = Column(Integer, primary_key=True)
+    # sha256 of the token, the token itself is never stored
+    token_hash = Column(String(64), unique=True, nullable=False)
+    user_id = Column(Integer, ForeignKey('Users.id'), nullable=False, index=True)
+    # every rotation of one login shares a family, reuse of a rotated token revokes all of it
+    family_id = Column(String(32), nullable=False, index=True)
+    expires_at = Column(Integer, nullable=False)  # unix seconds
+    revoked = Column(Boolean, nullable=False, default=False, server_default=false())
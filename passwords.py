@@ -0,0 +1,144 @@
+"""
+Password hashing on a bounded process pool.
+
+bcrypt costs ~250 ms of CPU per call, so hashing and verification run in
+worker processes instead of on the event loop. At most PASSWORD_HASH_WORKERS
+jobs run at once and at most PASSWORD_HASH_QUEUE_SIZE wait for a worker; a
+job that is refused or waits longer than PASSWORD_HASH_QUEUE_TIMEOUT seconds
+gets a 503 so login bursts cannot slow down the rest of the API.
+
+``hasher.start()`` spawns the workers at startup, since spawning takes
+seconds and would otherwise time out the first burst of logins. If a worker
+dies the pool is broken for good, so it is replaced and the job retried once.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+
+
+#these run inside the worker processes
+def _hash(password: str) -> str:
+    return bcrypt_context.hash(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return bcrypt_context.verify(password, hashed_password)
+
+
+def _ready() -> bool:
+    return True
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, queue_size: int, queue_timeout: float):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiting = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the server process holds threads and open DB sockets
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._loop is not loop:
+            self._slots = asyncio.Semaphore(max(self.workers, 1))
+            self._loop = loop
+        return self._slots
+
+    @staticmethod
+    def _busy() -> HTTPException:
+        return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                             detail='Password service is busy, please retry',
+                             headers={'Retry-After': '1'})
+
+    async def _run(self, func, *args):
+        if self.workers <= 0:
+            return await run_in_threadpool(func, *args)
+
+        slots = self._get_slots()
+        if slots.locked():
+            if self._waiting >= self.queue_size:
+                raise self._busy()
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._busy()
+            finally:
+                self._waiting -= 1
+        else:
+            await slots.acquire()
+
+        try:
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            try:
+                return await loop.run_in_executor(executor, func, *args)
+            except BrokenProcessPool:
+                # a worker was killed (OOM, signal); the executor never recovers, so replace it
+                self._discard(executor)
+                try:
+                    return await loop.run_in_executor(self._get_executor(), func, *args)
+                except BrokenProcessPool:
+                    self._discard(self._executor)
+                    raise self._busy()
+        finally:
+            slots.release()
+
+    def _discard(self, executor: Optional[ProcessPoolExecutor]):
+        if executor is not None and self._executor is executor:
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        """Spawn the workers now instead of on the first request."""
+        if self.workers <= 0:
+            return
+        executor = self._get_executor()
+        # workers are spawned as jobs arrive, one no-op each brings them all up in the background
+        for _ in range(self.workers):
+            executor.submit(_ready)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(_verify, password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hasher = PasswordHasher(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")),
+    queue_size=int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "32")),
+    queue_timeout=float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "2")),
+)
+
+
+async def hash_password(password: str) -> str:
+    return await hasher.hash(password)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await hasher.verify(password, hashed_password)
@@ -0,0 +1,163 @@
+"""
+On-demand request profiling.
+
+An admin sends ``X-Profile: 1`` (or ``?profile=1``) and gets, instead of the
+normal response, the sampled stacks of that request in collapsed format: one
+``frame;frame;frame count`` line per distinct stack, root first, ready for
+flamegraph.pl or speedscope. The role is taken from the ``user_role`` claim
+that ``get_current_user`` returns; the flag is ignored for anyone else. The
+original status code is kept in ``X-Profile-Status``.
+
+With ``PROFILE_SAMPLE_RATE`` above 0 that fraction of all requests is also
+profiled in the background and written to ``PROFILE_DIR``, one
+``.collapsed`` file per request, with the response left alone.
+
+The sampler is a thread that reads the event loop thread's stack every
+``PROFILE_INTERVAL_MS``, so it also sees whatever other requests the loop
+runs at the same time, and time spent awaiting the database shows up as the
+loop waiting in its selector. Sync endpoints, which run on the threadpool,
+are not covered. When no request asks for it, the cost is one header scan
+and, with sampling on, one ``random()`` call per request.
+"""
+
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from routers.auth import get_current_user
+
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def collapse(frame) -> str:
+    """One stack in collapsed format, outermost frame first."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """Counts the stacks of one thread, sampled every ``interval`` seconds from a background thread."""
+
+    def __init__(self, thread_id: int, interval: float = INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+            del frame
+
+    def start(self) -> 'Sampler':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def report(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _requested(scope: Scope) -> bool:
+    query_string = scope.get('query_string', b'')
+    if b'profile=' in query_string and ('profile', '1') in parse_qsl(query_string.decode('latin-1')):
+        return True
+    for name, value in scope['headers']:
+        if name == b'x-profile':
+            return value == b'1'
+    return False
+
+
+async def _is_admin(scope: Scope) -> bool:
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            scheme, _, token = value.decode('latin-1').partition(' ')
+            if scheme.lower() != 'bearer' or not token:
+                return False
+            try:
+                user = await get_current_user(token)
+            except HTTPException:
+                return False
+            return user.get('user_role') == 'admin'
+    return False
+
+
+def _write(directory: str, method: str, path: str, report: str) -> str:
+    os.makedirs(directory, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', path.strip('/')) or 'root'
+    filename = os.path.join(directory, f'{time.time_ns()}-{os.getpid()}-{method}-{slug}.collapsed')
+    with open(filename, 'w') as file:
+        file.write(report)
+    return filename
+
+
+class ProfilerMiddleware:
+    def __init__(self, app: ASGIApp, sample_rate: float = SAMPLE_RATE, directory: str = PROFILE_DIR,
+                 interval: float = INTERVAL):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.interval = interval
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        if _requested(scope) and await _is_admin(scope):
+            await self._profile_response(scope, receive, send)
+        elif self.sample_rate and random.random() < self.sample_rate:
+            sampler = Sampler(threading.get_ident(), self.interval).start()
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                sampler.stop()
+                await run_in_threadpool(_write, self.directory, scope['method'], scope['path'], sampler.report())
+        else:
+            await self.app(scope, receive, send)
+
+    async def _profile_response(self, scope: Scope, receive: Receive, send: Send):
+        status_code: Optional[int] = None
+
+        async def discard(message: Message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+
+        sampler = Sampler(threading.get_ident(), self.interval).start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            sampler.stop()
+        body = sampler.report().encode()
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/plain; charset=utf-8'),
+            (b'content-length', str(len(body)).encode()),
+            (b'x-profile-status', str(status_code).encode()),
+        ]})
+        await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,82 @@
+"""
+In-process publish/subscribe for per-user change events.
+
+Every subscriber gets its own bounded queue. Publishing never waits: a
+subscriber whose queue is full is evicted instead of slowing down the
+writer, and its stream ends so the client reconnects and reloads. Events
+only reach subscribers connected to the same worker process; a multi-worker
+deployment needs a shared broker (Redis pub/sub, Postgres LISTEN/NOTIFY)
+behind the same publish/subscribe calls.
+"""
+
+import asyncio
+import os
+from typing import Optional
+
+
+class Subscription:
+    def __init__(self, owner_id: int, queue_size: int):
+        self.owner_id = owner_id
+        self.evicted = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size + 1)
+        self._queue_size = queue_size
+
+    def _offer(self, event: dict) -> bool:
+        # the extra slot is kept free for the eviction marker
+        if self._queue.qsize() >= self._queue_size:
+            return False
+        self._queue.put_nowait(event)
+        return True
+
+    def _evict(self):
+        self.evicted = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Next event, or None once evicted. Raises asyncio.TimeoutError after timeout seconds."""
+        if timeout is None:
+            return await self._queue.get()
+        return await asyncio.wait_for(self._queue.get(), timeout=timeout)
+
+
+class Broker:
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.published = 0
+        self.evictions = 0
+        self._subscribers: dict = {}
+
+    def subscribe(self, owner_id: int) -> Subscription:
+        subscription = Subscription(owner_id, self.queue_size)
+        self._subscribers.setdefault(owner_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.owner_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.owner_id]
+
+    def publish(self, owner_id: int, event: dict) -> int:
+        """Queue the event for every subscriber of owner_id. Returns how many received it."""
+        self.published += 1
+        delivered = 0
+        for subscription in list(self._subscribers.get(owner_id, ())):
+            if subscription._offer(event):
+                delivered += 1
+            else:
+                self.unsubscribe(subscription)
+                subscription._evict()
+                self.evictions += 1
+        return delivered
+
+    def stats(self) -> dict:
+        return {'subscribers': sum(len(subscribers) for subscribers in self._subscribers.values()),
+                'queue_size': self.queue_size, 'published': self.published, 'evictions': self.evictions}
+
+
+#todo change feed, served by routers/events.py
+todo_events = Broker(queue_size=int(os.getenv("EVENTS_QUEUE_SIZE", "100")))
@@ -1,39 +1,114 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, status
-from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Annotated, Literal, Optional
 from pydantic import BaseModel, Field
-from models import Todos
-from database import SessionLocal
-from sqlalchemy.orm import Session
+from models import Todos, TodoStats
+from database import AsyncSessionLocal, get_db, get_pool_status
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from routers import auth
+from routers.todos import TodoResponse, TodoStatsResponse
+import cache
+from pubsub import todo_events
+from etags import bump_data_version
+import counters
+import csv
+import io
+import json
 
 router = APIRouter(prefix='/admin', tags=['admin'])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+user_dependency = Annotated[dict, Depends(auth.get_current_user)]
 
+EXPORT_COLUMNS = ['id', 'title', 'description', 'priority', 'complete', 'owner_id']
+EXPORT_BATCH_SIZE = 1000
 
-db_dependency = Annotated[Session, Depends(get_db)]
-user_dependency = Annotated[dict, Depends(auth.get_current_user)]
+#rows are fetched from a server-side cursor EXPORT_BATCH_SIZE at a time and written out
+#per batch, so memory stays flat however large the table is
+async def _export_todos(query, export_format: str):
+    # the request's session is closed before the body is streamed, so use a dedicated one
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        if export_format == 'csv':
+            yield ','.join(EXPORT_COLUMNS) + '\n'
+        async for rows in result.mappings().partitions():
+            buffer = io.StringIO()
+            if export_format == 'csv':
+                csv.writer(buffer, lineterminator='\n').writerows([row[column] for column in EXPORT_COLUMNS] for row in rows)
+            else:
+                for row in rows:
+                    buffer.write(json.dumps(dict(row)) + '\n')
+            yield buffer.getvalue()
 
-@router.get("/todos", status_code=status.HTTP_200_OK)
-def show_todos(user: user_dependency, db: db_dependency):
+@router.get("/todos", status_code=status.HTTP_200_OK, response_model=list[TodoResponse])
+async def show_todos(user: user_dependency,
+                     db: db_dependency,
+                     format: Literal['json', 'ndjson', 'csv'] = 'json',
+                     owner_id: Optional[int] = None,
+                     complete: Optional[bool] = None):
     if user is None or user['user_role'] != 'admin':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Admin access required')
-    return db.query(Todos).all()
+    query = select(*[getattr(Todos, column) for column in EXPORT_COLUMNS]).order_by(Todos.id)
+    if owner_id is not None:
+        query = query.where(Todos.owner_id == owner_id)
+    if complete is not None:
+        query = query.where(Todos.complete == complete)
+
+    if format == 'ndjson':
+        return StreamingResponse(_export_todos(query, format), media_type='application/x-ndjson')
+    if format == 'csv':
+        return StreamingResponse(_export_todos(query, format), media_type='text/csv',
+                                 headers={'Content-Disposition': 'attachment; filename="todos.csv"'})
+    return (await db.execute(query)).mappings().all()
 
 @router.delete("/todos/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_todo_by_admin(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
+async def delete_todo_by_admin(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
     if user is None or user['user_role'] != 'admin':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Admin access required')
     
-    todo = db.query(Todos).filter(Todos.id == todo_id).first()
+    todo = (await db.execute(
+        delete(Todos).where(Todos.id == todo_id)
+        .returning(Todos.owner_id, Todos.priority, Todos.complete)
+        .execution_options(synchronize_session=False)
+    )).first()
     if todo is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
-    
-    db.delete(todo)
-    db.commit()
-    return None  # 204 No Content returns empty response
\ No newline at end of file
+
+    await counters.apply_delta(db, todo.owner_id, removed=[(todo.priority, todo.complete)])
+    await bump_data_version(db, todo.owner_id)
+    await db.commit()
+    cache.todo_cache.invalidate(todo.owner_id)
+    todo_events.publish(todo.owner_id, {'type': 'todo.deleted', 'id': todo_id})
+    return None  # 204 No Content returns empty response
+
+#per-owner todo counts, one page of owners at a time, next page token in X-Next-Cursor
+@router.get("/stats", status_code=status.HTTP_200_OK, response_model=list[TodoStatsResponse])
+async def show_stats(user: user_dependency,
+                     db: db_dependency,
+                     response: Response,
+                     limit: int = Query(default=100, ge=1, le=1000),
+                     after_owner_id: int = Query(default=0, ge=0)):
+    if user is None or user['user_role'] != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Admin access required')
+    rows = (await db.scalars(
+        select(TodoStats).where(TodoStats.owner_id > after_owner_id).order_by(TodoStats.owner_id).limit(limit + 1)
+    )).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers['X-Next-Cursor'] = str(rows[-1].owner_id)
+    return [counters.stats_dict(row, row.owner_id) for row in rows]
+
+#connection pool usage of this worker, for sizing DB_POOL_SIZE / DB_MAX_OVERFLOW
+@router.get("/pool-stats", status_code=status.HTTP_200_OK)
+async def show_pool_stats(user: user_dependency):
+    if user is None or user['user_role'] != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Admin access required')
+    return get_pool_status()
+
+#hit/miss counters of the in-process caches of this worker
+@router.get("/cache-stats", status_code=status.HTTP_200_OK)
+async def show_cache_stats(user: user_dependency):
+    if user is None or user['user_role'] != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Admin access required')
+    return {'jwt': auth.token_cache.stats(), 'todos': cache.todo_cache.stats(), 'events': todo_events.stats()}
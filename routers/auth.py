@@ -1,40 +1,36 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from pydantic import BaseModel
-from database import SessionLocal
-from models import Users
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from database import get_db
+from models import RefreshTokens, Users
+from cache import LRUCache
+from passwords import hash_password, verify_password
+from throttle import check_login, record_login
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta, datetime, timezone
 from jose import jwt, JWTError
+import hashlib
+import metrics
 import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+import secrets
+import time
+from settings import get_settings
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 
-# Get secret key from environment variable  
-_secret_key = os.getenv("SECRET_KEY")
-if not _secret_key:
-    raise ValueError("SECRET_KEY environment variable is required")
-secret_key: str = _secret_key
-
 algorithm = 'HS256'
 
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+#read on first use, create_app calls it so a missing key still fails at startup
+def signing_key() -> str:
+    secret_key = get_settings().secret_key
+    if not secret_key:
+        raise ValueError("SECRET_KEY environment variable is required")
+    return secret_key
 
 #dependencies
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 login_dependency = Annotated[OAuth2PasswordRequestForm, Depends()]
 oauth2bearer = OAuth2PasswordBearer(tokenUrl='auth/token')
 
@@ -52,35 +48,38 @@ class UserRequest(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    expires_in: int
+    refresh_token: str
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 #Adding the user to the Users class to be added to the database
 @router.post("/new-user", status_code=status.HTTP_201_CREATED)
-def create_user(user: UserRequest, db: db_dependency):
-    new_user = Users(
+async def create_user(user: UserRequest, db: db_dependency):
+    hashed_password = await hash_password(user.password)
+    user_id = await db.scalar(insert(Users).values(
         email = user.email,
         username = user.username,
         first_name = user.first_name,
         last_name = user.last_name,
-        hashed_password = bcrypt_context.hash(user.password),
+        hashed_password = hashed_password,
         is_active = user.is_active,
         role = user.role,
         phone_number = user.phone_number
-        )
-
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    return {"message": "User created successfully", "user_id": new_user.id}
+        ).returning(Users.id))
+    await db.commit()
+    return {"message": "User created successfully", "user_id": user_id}
 
 #authenticate user and login
 
 #spearate function for user authentication
-def authenticate_user(username: str, password: str, db):
-    user = db.query(Users).filter(Users.username == username).first()
+async def authenticate_user(username: str, password: str, db):
+    user = (await db.scalars(select(Users).where(Users.username == username))).first()
     if not user:
         return None
-    match = bcrypt_context.verify(password, user.hashed_password)
+    match = await verify_password(password, user.hashed_password)
     if not match:
         return False
     return user
@@ -90,33 +89,119 @@ def create_access_token(username, user_id, role, expiry_delta: timedelta):
     cairo_time = timezone(timedelta(hours=2))
     expiry = datetime.now(cairo_time) + expiry_delta
     encode = {'sub': username, 'id': user_id, 'role': role, 'exp': expiry}
-    access_token = jwt.encode(encode, secret_key, algorithm=algorithm)
+    access_token = jwt.encode(encode, signing_key(), algorithm=algorithm)
     return access_token
 
+#refresh tokens are random, so a plain sha256 is enough to store them safely
+def _refresh_token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def issue_refresh_token(db, user_id: int, family_id: Optional[str] = None) -> str:
+    token = secrets.token_urlsafe(32)
+    await db.execute(insert(RefreshTokens).values(
+        token_hash=_refresh_token_hash(token),
+        user_id=user_id,
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=int(time.time() + get_settings().refresh_token_expiry.total_seconds()),
+        ))
+    return token
+
+async def revoke_refresh_tokens(db, user_id: int):
+    await db.execute(update(RefreshTokens)
+                     .where(RefreshTokens.user_id == user_id, RefreshTokens.revoked.is_(False))
+                     .values(revoked=True))
+
+def _token_response(user_id: int, username: str, role: str, refresh_token: str) -> dict:
+    access_token_expiry = get_settings().access_token_expiry
+    return {"access_token": create_access_token(username, user_id, role, access_token_expiry),
+            "token_type": "bearer",
+            "expires_in": int(access_token_expiry.total_seconds()),
+            "refresh_token": refresh_token}
+
+#verified claims keyed by sha256 of the token, each entry lives until the token's exp
+token_cache = LRUCache(maxsize=int(os.getenv("JWT_CACHE_SIZE", "10000")))
+
 #A function to decode JWTs
-def get_current_user(token: Annotated[str, Depends(oauth2bearer)]):
+async def get_current_user(token: Annotated[str, Depends(oauth2bearer)]):
+    with metrics.timing('auth'):
+        return _decode_token(token)
+
+def _decode_token(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(key)
+    if claims is not None:
+        return dict(claims)
     try:
-        payload = jwt.decode(token, secret_key, algorithms=[algorithm])
+        payload = jwt.decode(token, signing_key(), algorithms=[algorithm])
         username = payload['sub']
         user_id = payload['id']
         user_role = payload['role']
         if username is None or user_id is None:
             raise HTTPException(status_code=401, detail='could not validate user')
-        return {'username': username, 'id': user_id, 'user_role': user_role}
+        claims = {'username': username, 'id': user_id, 'user_role': user_role}
     except JWTError:
         raise HTTPException(status_code=401, detail='could not validate user')
+    # only tokens that passed verification are cached, and never past their expiry
+    if isinstance(payload.get('exp'), (int, float)):
+        token_cache.set(key, claims, expires_at=payload['exp'])
+    return dict(claims)
     
 
 
 #login endpoint
 @router.post("/token", response_model=Token)
-def login_for_access_token(credentials: login_dependency, db: db_dependency):
-    user = authenticate_user(credentials.username, credentials.password, db)
+async def login_for_access_token(request: Request, credentials: login_dependency, db: db_dependency):
+    # refused attempts never reach the database or bcrypt
+    client_ip = request.client.host if request.client else ''
+    check_login(client_ip, credentials.username)
+    user = await authenticate_user(credentials.username, credentials.password, db)
+    record_login(client_ip, credentials.username, bool(user))
     match user:
         case None:
             raise HTTPException(status_code=404, detail="User not found")
         case False:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         case _:
-            token = create_access_token(user.username, user.id, user.role, timedelta(minutes=20))
-            return {"access_token": token, "token_type": "bearer"}
\ No newline at end of file
+            refresh_token = await issue_refresh_token(db, user.id)
+            await db.commit()
+            return _token_response(user.id, user.username, user.role, refresh_token)
+
+
+#exchange a refresh token for a new access token and a new refresh token, no password involved
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(body: RefreshRequest, db: db_dependency):
+    token_hash = _refresh_token_hash(body.refresh_token)
+    # revoking and reading in one statement, so two concurrent refreshes can't both rotate it
+    rotated = (await db.execute(update(RefreshTokens)
+                                .where(RefreshTokens.token_hash == token_hash,
+                                       RefreshTokens.revoked.is_(False),
+                                       RefreshTokens.expires_at > int(time.time()))
+                                .values(revoked=True)
+                                .returning(RefreshTokens.user_id, RefreshTokens.family_id))).first()
+    if rotated is None:
+        # a token that was already rotated is being replayed, end every session of that login
+        family_id = await db.scalar(select(RefreshTokens.family_id).where(RefreshTokens.token_hash == token_hash,
+                                                                          RefreshTokens.revoked.is_(True)))
+        if family_id is not None:
+            await db.execute(update(RefreshTokens).where(RefreshTokens.family_id == family_id).values(revoked=True))
+            await db.commit()
+        raise HTTPException(status_code=401, detail='could not validate refresh token')
+
+    user = (await db.execute(select(Users.username, Users.role, Users.is_active)
+                             .where(Users.id == rotated.user_id))).first()
+    if user is None or not user.is_active:
+        await db.commit()
+        raise HTTPException(status_code=401, detail='could not validate refresh token')
+    refresh_token = await issue_refresh_token(db, rotated.user_id, rotated.family_id)
+    await db.commit()
+    return _token_response(rotated.user_id, user.username, user.role, refresh_token)
+
+
+#revoke a refresh token and the rest of its family, the access token simply runs out
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(body: RefreshRequest, db: db_dependency):
+    family_id = await db.scalar(select(RefreshTokens.family_id)
+                                .where(RefreshTokens.token_hash == _refresh_token_hash(body.refresh_token)))
+    if family_id is not None:
+        await db.execute(update(RefreshTokens).where(RefreshTokens.family_id == family_id).values(revoked=True))
+        await db.commit()
\ No newline at end of file
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from typing import Annotated
+from routers import auth
+from pubsub import Subscription, todo_events
+import asyncio
+import json
+import os
+
+router = APIRouter(prefix='/events', tags=['events'])
+
+user_dependency = Annotated[dict, Depends(auth.get_current_user)]
+
+#seconds between comment lines that keep idle connections (and proxies) open
+KEEPALIVE_INTERVAL = float(os.getenv("EVENTS_KEEPALIVE", "15"))
+
+def _format_event(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+async def _stream(request: Request, subscription: Subscription):
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                event = await subscription.get(timeout=KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ': keepalive\n\n'
+                continue
+            if event is None:
+                # the client fell too far behind; it reconnects and reloads its todos
+                yield _format_event({'type': 'resync'})
+                break
+            yield _format_event(event)
+    finally:
+        todo_events.unsubscribe(subscription)
+
+#server-sent events with the user's todo changes: todo.created, todo.updated, todo.deleted and resync
+@router.get('/todos', status_code=status.HTTP_200_OK)
+async def todo_events_stream(user: user_dependency, request: Request):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
+    subscription = todo_events.subscribe(user['id'])
+    return StreamingResponse(_stream(request, subscription), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -1,96 +1,397 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, status
-from typing import Annotated
-from pydantic import BaseModel, Field
-from models import Todos
-from database import SessionLocal
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Body, Depends, HTTPException, Path, Query, Request, Response, status
+from typing import Annotated, Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+from models import Todos, TodoStats
+from database import get_db
+from sqlalchemy import and_, delete, insert, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from routers import auth
+import cache
+from pubsub import todo_events
+from etags import bump_data_version, get_data_version, weak_etag, is_not_modified
+import counters
+import search
+import base64
+import binascii
+import json
 
 router = APIRouter(prefix='/todos', tags=['todos'])
 
-def get_db():
-    db = SessionLocal()
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+user_dependency = Annotated[dict, Depends(auth.get_current_user)]
+
+#post validation
+class TodoRequest(BaseModel):
+    title: str = Field(min_length=1)
+    description: str = Field(min_length=1, max_length=100)
+    priority: int = Field(gt=0, lt=6)
+
+#update validation - allows updating complete status
+class TodoUpdateRequest(BaseModel):
+    title: str = Field(min_length=1)
+    description: str = Field(min_length=1, max_length=100)
+    priority: int = Field(gt=0, lt=6)
+    complete: bool
+
+#patch validation - only the fields sent are updated
+class TodoPatchRequest(BaseModel):
+    title: Optional[str] = Field(default=None, min_length=1)
+    description: Optional[str] = Field(default=None, min_length=1, max_length=100)
+    priority: Optional[int] = Field(default=None, gt=0, lt=6)
+    complete: Optional[bool] = None
+
+    @field_validator('title', 'description', 'priority', 'complete')
+    @classmethod
+    def not_null(cls, value):
+        # fields may be left out, but the columns can't be cleared
+        if value is None:
+            raise ValueError('must not be null')
+        return value
+
+    @model_validator(mode='after')
+    def not_empty(self):
+        if not self.model_fields_set:
+            raise ValueError('at least one field is required')
+        return self
+
+#batch validation
+MAX_BATCH_SIZE = 1000
+
+class TodoBatchUpdateRequest(TodoUpdateRequest):
+    id: int = Field(gt=0)
+
+class TodoBatchDeleteRequest(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+#response models
+class TodoResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: Optional[str]
+    description: Optional[str]
+    priority: Optional[int]
+    complete: Optional[bool]
+    owner_id: Optional[int]
+
+class TodoWriteResponse(BaseModel):
+    message: str
+    todo: TodoResponse
+
+class BatchItemResult(BaseModel):
+    index: int
+    id: int
+    status: int
+
+class BatchResponse(BaseModel):
+    results: list[BatchItemResult]
+
+class TodoStatsResponse(BaseModel):
+    owner_id: int
+    total: int
+    completed: int
+    pending: int
+    by_priority: dict[str, int]
+
+
+TodoSort = Literal['id', '-id', 'priority', '-priority']
+
+#keyset columns for each sort order, id is always the tie breaker
+def _sort_columns(sort: str):
+    if sort.lstrip('-') == 'priority':
+        return [Todos.priority, Todos.id]
+    return [Todos.id]
+
+#reads select plain columns, skipping ORM hydration; cached values are plain dicts
+TODO_COLUMNS = (Todos.id, Todos.title, Todos.description, Todos.priority, Todos.complete, Todos.owner_id)
+
+#cursor tokens are the sort key of the last row on the page
+def _encode_cursor(sort: str, todo: dict) -> str:
+    key = [todo[column.key] for column in _sort_columns(sort)]
+    raw = json.dumps({'sort': sort, 'key': key}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _load_cursor(cursor: str) -> dict:
+    return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+
+def _decode_cursor(cursor: str, sort: str) -> list:
     try:
-        yield db
-    finally:
-        db.close()
+        data = _load_cursor(cursor)
+        key = data['key']
+        if data['sort'] != sort or len(key) != len(_sort_columns(sort)):
+            raise ValueError('cursor does not match sort order')
+        return [int(value) for value in key]
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='invalid cursor')
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
-user_dependency = Annotated[dict, Depends(auth.get_current_user)]
+#get todos of user one page at a time, the next page token is sent in X-Next-Cursor
+@router.get('/', status_code=status.HTTP_200_OK, response_model=list[TodoResponse])
+async def get_todo_of_user(user: user_dependency,
+                           db: db_dependency,
+                           request: Request,
+                           response: Response,
+                           limit: int = Query(default=100, ge=1, le=500),
+                           cursor: Optional[str] = None,
+                           sort: TodoSort = 'id',
+                           complete: Optional[bool] = None,
+                           priority: Optional[int] = Query(default=None, gt=0, lt=6),
+                           min_priority: Optional[int] = Query(default=None, gt=0, lt=6)):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
+    columns = _sort_columns(sort)
+    descending = sort.startswith('-')
 
+    async def load_page():
+        query = select(*TODO_COLUMNS).where(Todos.owner_id == user['id'])
+        if complete is not None:
+            query = query.where(Todos.complete == complete)
+        if priority is not None:
+            query = query.where(Todos.priority == priority)
+        if min_priority is not None:
+            query = query.where(Todos.priority >= min_priority)
+        if cursor is not None:
+            key, last = tuple_(*columns), tuple_(*_decode_cursor(cursor, sort))
+            query = query.where(key < last if descending else key > last)
+        query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
 
-#get all todos based on user
-@router.get('/', status_code=status.HTTP_200_OK)
-def get_todo_of_user(user: user_dependency, db: db_dependency):
+        todos = [dict(row) for row in (await db.execute(query.limit(limit + 1))).mappings()]
+        next_cursor = None
+        if len(todos) > limit:
+            todos = todos[:limit]
+            next_cursor = _encode_cursor(sort, todos[-1])
+        return {'items': todos, 'next_cursor': next_cursor}
+
+    # the data version is part of the cache key, so entries cached by this worker
+    # can never outlive a write made through another worker
+    version = await get_data_version(db, user['id'])
+    cache_key = ('list', version, limit, cursor, sort, complete, priority, min_priority)
+    etag = weak_etag(user['id'], version, *cache_key)
+    if is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    page = await cache.todo_cache.read_through(user['id'], cache_key, load_page)
+    response.headers['ETag'] = etag
+    if page['next_cursor'] is not None:
+        response.headers['X-Next-Cursor'] = page['next_cursor']
+    return page['items']
+
+#batch endpoints apply every item in one transaction with one statement per operation,
+#they are declared before /{todo_id} so "batch" is not parsed as an id;
+#listeners get a single resync event instead of one event per item
+@router.post("/batch", status_code=status.HTTP_201_CREATED, response_model=BatchResponse)
+async def create_todos_batch(user: user_dependency,
+                             db: db_dependency,
+                             todos: Annotated[list[TodoRequest], Body(min_length=1, max_length=MAX_BATCH_SIZE)]):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
-    todos = db.query(Todos).filter(Todos.owner_id == user['id']).all()
-    return todos
+    rows = [{**todo.model_dump(), 'complete': False, 'owner_id': user['id']} for todo in todos]
+    if db.bind.dialect.name == 'postgresql':
+        # batched multi-row INSERTs (insertmanyvalues), SQLAlchemy matches the ids back to the rows
+        ids = (await db.scalars(insert(Todos).returning(Todos.id, sort_by_parameter_order=True), rows)).all()
+    else:
+        # aiosqlite has no sentinel support, so the form above would run one INSERT per row; a single
+        # multi-row INSERT assigns rowids in row order, RETURNING just doesn't promise to list them so
+        ids = sorted((await db.scalars(insert(Todos).values(rows).returning(Todos.id))).all())
+    await counters.apply_delta(db, user['id'], added=[(todo.priority, False) for todo in todos])
+    await bump_data_version(db, user['id'])
+    await db.commit()
+    cache.todo_cache.invalidate(user['id'])
+    todo_events.publish(user['id'], {'type': 'resync'})
+    return {"results": [{"index": index, "id": todo_id, "status": status.HTTP_201_CREATED}
+                        for index, todo_id in enumerate(ids)]}
+
+@router.put("/batch", status_code=status.HTTP_200_OK, response_model=BatchResponse)
+async def update_todos_batch(user: user_dependency,
+                             db: db_dependency,
+                             todos: Annotated[list[TodoBatchUpdateRequest], Body(min_length=1, max_length=MAX_BATCH_SIZE)]):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
+    requested_ids = {todo.id for todo in todos}
+    # locked until the commit, like _update_todo, so the counter deltas are computed from current values
+    current = {row.id: (row.priority, row.complete) for row in await db.execute(
+        select(Todos.id, Todos.priority, Todos.complete).where(Todos.owner_id == user['id'], Todos.id.in_(requested_ids))
+        .order_by(Todos.id).with_for_update()
+    )}
+    owned = set(current)
+
+    # the last item wins when an id is repeated
+    rows = {todo.id: todo.model_dump() for todo in todos if todo.id in owned}
+    if rows:
+        # ORM bulk UPDATE by primary key, executed as a single executemany
+        await db.execute(update(Todos), list(rows.values()))
+        await counters.apply_delta(db, user['id'],
+                                   added=[(row['priority'], row['complete']) for row in rows.values()],
+                                   removed=[current[todo_id] for todo_id in rows])
+        await bump_data_version(db, user['id'])
+        await db.commit()
+        cache.todo_cache.invalidate(user['id'])
+        todo_events.publish(user['id'], {'type': 'resync'})
+    return {"results": [{"index": index, "id": todo.id,
+                         "status": status.HTTP_200_OK if todo.id in owned else status.HTTP_404_NOT_FOUND}
+                        for index, todo in enumerate(todos)]}
+
+@router.delete("/batch", status_code=status.HTTP_200_OK, response_model=BatchResponse)
+async def delete_todos_batch(user: user_dependency, db: db_dependency, batch: TodoBatchDeleteRequest):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
+    deleted_rows = (await db.execute(
+        delete(Todos).where(Todos.owner_id == user['id'], Todos.id.in_(set(batch.ids)))
+        .returning(Todos.id, Todos.priority, Todos.complete)
+    )).all()
+    deleted = {row.id for row in deleted_rows}
+    if deleted:
+        await counters.apply_delta(db, user['id'], removed=[(row.priority, row.complete) for row in deleted_rows])
+        await bump_data_version(db, user['id'])
+        await db.commit()
+        cache.todo_cache.invalidate(user['id'])
+        todo_events.publish(user['id'], {'type': 'resync'})
+    return {"results": [{"index": index, "id": todo_id,
+                         "status": status.HTTP_204_NO_CONTENT if todo_id in deleted else status.HTTP_404_NOT_FOUND}
+                        for index, todo_id in enumerate(batch.ids)]}
+
+#ranked full-text search of the user's todos, best match first, next page token in X-Next-Cursor
+@router.get("/search", status_code=status.HTTP_200_OK, response_model=list[TodoResponse])
+async def search_todos(user: user_dependency,
+                       db: db_dependency,
+                       response: Response,
+                       q: str = Query(min_length=1, max_length=200),
+                       limit: int = Query(default=20, ge=1, le=100),
+                       cursor: Optional[str] = None):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
+    query, score = search.search_query(db.bind.dialect.name, user['id'], q, TODO_COLUMNS)
+    if query is None:
+        return []
+    if cursor is not None:
+        try:
+            data = _load_cursor(cursor)
+            last_score, last_id = float(data['score']), int(data['id'])
+        except (ValueError, KeyError, TypeError, binascii.Error):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='invalid cursor')
+        query = query.where(or_(score < last_score, and_(score == last_score, Todos.id > last_id)))
+
+    rows = (await db.execute(query.order_by(score.desc(), Todos.id).limit(limit + 1))).mappings().all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        raw = json.dumps({'score': rows[-1]['score'], 'id': rows[-1]['id']}, separators=(',', ':')).encode()
+        response.headers['X-Next-Cursor'] = base64.urlsafe_b64encode(raw).decode().rstrip('=')
+    return rows
+
+#todo counts of the user, read from the materialized TodoStats row
+@router.get("/stats", status_code=status.HTTP_200_OK, response_model=TodoStatsResponse)
+async def get_todo_stats(user: user_dependency, db: db_dependency, request: Request, response: Response):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
+    version = await get_data_version(db, user['id'])
+    etag = weak_etag(user['id'], version, 'stats')
+    if is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    response.headers['ETag'] = etag
+    return counters.stats_dict(await db.get(TodoStats, user['id']), user['id'])
 
 #fetch todo of user by ID
-@router.get("/{todo_id}", status_code=status.HTTP_200_OK)
-def get_todo_by_id(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
+@router.get("/{todo_id}", status_code=status.HTTP_200_OK, response_model=TodoResponse)
+async def get_todo_by_id(user: user_dependency,
+                         db: db_dependency,
+                         request: Request,
+                         response: Response,
+                         todo_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
-    todo = db.query(Todos).filter(Todos.owner_id == user['id']).filter(Todos.id == todo_id).first()
+
+    async def load_todo():
+        todo = (await db.execute(
+            select(*TODO_COLUMNS).where(Todos.owner_id == user['id'], Todos.id == todo_id)
+        )).mappings().first()
+        return None if todo is None else dict(todo)
+
+    version = await get_data_version(db, user['id'])
+    etag = weak_etag(user['id'], version, 'todo', todo_id)
+    if is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    todo = await cache.todo_cache.read_through(user['id'], ('todo', version, todo_id), load_todo)
     if todo is not None:
+        response.headers['ETag'] = etag
         return todo
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="todo not found")
     
-#post validation
-class TodoRequest(BaseModel):
-    title: str = Field(min_length=1)
-    description: str = Field(min_length=1, max_length=100)
-    priority: int = Field(gt=0, lt=6)
-
-#update validation - allows updating complete status
-class TodoUpdateRequest(BaseModel):
-    title: str = Field(min_length=1)
-    description: str = Field(min_length=1, max_length=100)
-    priority: int = Field(gt=0, lt=6)
-    complete: bool
-    
 #create a todo
-@router.post("/", status_code=status.HTTP_201_CREATED)
-def create_todo(user: user_dependency, db: db_dependency, todo: TodoRequest):
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=TodoWriteResponse)
+async def create_todo(user: user_dependency, db: db_dependency, todo: TodoRequest):
     if user['username'] is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
-    Todos_model = Todos(**todo.model_dump())
-    Todos_model.owner_id = user['id']
-    db.add(Todos_model)
-    db.commit()
-    db.refresh(Todos_model)
-    return {"message": "Todo created successfully", "todo": Todos_model}
-
-@router.put("/{todo_id}", status_code=status.HTTP_200_OK)
-def update_todo(user: user_dependency,
-                db: db_dependency,
-                todo: TodoUpdateRequest,
-                todo_id: int = Path(gt=0)):
+    new_todo = (await db.execute(
+        insert(Todos).values(**todo.model_dump(), complete=False, owner_id=user['id']).returning(*TODO_COLUMNS)
+    )).mappings().one()
+    await counters.apply_delta(db, user['id'], added=[(todo.priority, False)])
+    await bump_data_version(db, user['id'])
+    await db.commit()
+    cache.todo_cache.invalidate(user['id'])
+    todo_events.publish(user['id'], {'type': 'todo.created', 'todo': dict(new_todo)})
+    return {"message": "Todo created successfully", "todo": new_todo}
+
+#shared by PUT and PATCH, writes only the given columns
+async def _update_todo(db: AsyncSession, owner_id: int, todo_id: int, values: dict):
+    # the row lock makes concurrent updates of this todo take turns, so each one moves the
+    # counters from the values the previous one left (SQLite serializes writers anyway)
+    current = (await db.execute(
+        select(Todos.priority, Todos.complete).where(Todos.owner_id == owner_id, Todos.id == todo_id)
+        .with_for_update()
+    )).first()
+    if current is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="todo not found")
+    await counters.apply_delta(db, owner_id,
+                               added=[(values.get('priority', current.priority), values.get('complete', current.complete))],
+                               removed=[(current.priority, current.complete)])
+    updated_todo = (await db.execute(
+        update(Todos).where(Todos.owner_id == owner_id, Todos.id == todo_id)
+        .values(**values).returning(*TODO_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )).mappings().one()
+
+    await bump_data_version(db, owner_id)
+    await db.commit()
+    cache.todo_cache.invalidate(owner_id)
+    todo_events.publish(owner_id, {'type': 'todo.updated', 'todo': dict(updated_todo)})
+    return {"message": "Todo updated successfully", "todo": updated_todo}
+
+@router.put("/{todo_id}", status_code=status.HTTP_200_OK, response_model=TodoWriteResponse)
+async def update_todo(user: user_dependency,
+                      db: db_dependency,
+                      todo: TodoUpdateRequest,
+                      todo_id: int = Path(gt=0)):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
+    return await _update_todo(db, user['id'], todo_id, todo.model_dump())
+
+@router.patch("/{todo_id}", status_code=status.HTTP_200_OK, response_model=TodoWriteResponse)
+async def patch_todo(user: user_dependency,
+                     db: db_dependency,
+                     todo: TodoPatchRequest,
+                     todo_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
-    original_todo = db.query(Todos).filter(Todos.owner_id == user['id']).filter(Todos.id == todo_id).first()
-    if original_todo is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="todo not found")
-    
-    update = todo.model_dump()
-    for key, value in update.items():
-        setattr(original_todo, key, value)
-    db.commit()
-    db.refresh(original_todo)
-    return {"message": "Todo updated successfully", "todo": original_todo}
+    return await _update_todo(db, user['id'], todo_id, todo.model_dump(exclude_unset=True))
 
 #del req func
 @router.delete("/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_todo(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
+async def delete_todo(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
-    todo = db.query(Todos).filter(Todos.owner_id == user['id']).filter(Todos.id == todo_id).first()
+    todo = (await db.execute(
+        delete(Todos).where(Todos.owner_id == user['id'], Todos.id == todo_id)
+        .returning(Todos.priority, Todos.complete)
+        .execution_options(synchronize_session=False)
+    )).first()
     if todo is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="todo not found")
-    
-    db.delete(todo)
-    db.commit()
+
+    await counters.apply_delta(db, user['id'], removed=[(todo.priority, todo.complete)])
+    await bump_data_version(db, user['id'])
+    await db.commit()
+    cache.todo_cache.invalidate(user['id'])
+    todo_events.publish(user['id'], {'type': 'todo.deleted', 'id': todo_id})
     return None  # 204 No Content returns empty response
\ No newline at end of file
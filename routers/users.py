@@ -1,34 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, status
-from typing import Annotated, cast
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, Response, status
+from typing import Annotated, Optional, cast
+from pydantic import BaseModel, ConfigDict, Field
 from models import Todos, Users
-from database import SessionLocal
-from sqlalchemy.orm import Session
+from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
 from routers import auth
-from passlib.context import CryptContext
+from passwords import hash_password, verify_password
+from etags import weak_etag, is_not_modified
 
 router = APIRouter(prefix='/users', tags=['users'])
 
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+user_dependency = Annotated[dict, Depends(auth.get_current_user)]
 
+#response model, keeps the existing display-style keys of user-info
+class UserInfoResponse(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
 
-db_dependency = Annotated[Session, Depends(get_db)]
-user_dependency = Annotated[dict, Depends(auth.get_current_user)]
+    id: int = Field(alias='ID')
+    username: Optional[str] = Field(alias='Username')
+    email: Optional[str] = Field(alias='Email')
+    first_name: Optional[str] = Field(alias='First Name')
+    last_name: Optional[str] = Field(alias='Last Name')
+    is_active: Optional[bool] = Field(alias='Status')
+    role: Optional[str] = Field(alias='Role')
+    phone_number: Optional[str] = Field(alias='Phone Number')
 
-@router.get('/user-info', status_code=status.HTTP_200_OK)
-def get_active_users(user: user_dependency, db: db_dependency):
+@router.get('/user-info', status_code=status.HTTP_200_OK, response_model=UserInfoResponse)
+async def get_active_users(user: user_dependency, db: db_dependency, request: Request, response: Response):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate user')
-    current_user = db.query(Users).filter(Users.id == user['id']).first()
+    current_user = await db.get(Users, user['id'])
     if current_user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='User not found')
+    etag = weak_etag(current_user.id, current_user.data_version, 'user-info')
+    if is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    response.headers['ETag'] = etag
     user_info = {'ID': current_user.id,
                  'Username': current_user.username,
                  'Email': current_user.email,
@@ -40,27 +48,31 @@ def get_active_users(user: user_dependency, db: db_dependency):
     return user_info
 
 @router.post('/change-password', status_code=status.HTTP_204_NO_CONTENT)
-def change_password(user: user_dependency, db: db_dependency, old_password: str, new_password: str):
+async def change_password(user: user_dependency, db: db_dependency, old_password: str, new_password: str):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate user')
-    current_user = db.query(Users).filter(Users.id == user['id']).first()
+    current_user = await db.get(Users, user['id'])
     if current_user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='User not found')
-    match = bcrypt_context.verify(old_password, str(current_user.hashed_password))
+    match = await verify_password(old_password, str(current_user.hashed_password))
     if not match:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Current password is incorrect')
-    hashed_new_password = bcrypt_context.hash(new_password)
+    hashed_new_password = await hash_password(new_password)
     setattr(current_user, 'hashed_password', hashed_new_password)
-    db.commit()
+    setattr(current_user, 'data_version', Users.data_version + 1)
+    # other devices have to log in again with the new password
+    await auth.revoke_refresh_tokens(db, current_user.id)
+    await db.commit()
     # Return 204 No Content for successful password change
 
 @router.post('/change-phone-number', status_code=status.HTTP_204_NO_CONTENT)
-def change_phone_number(user: user_dependency, db: db_dependency, new_phone_number: str):
+async def change_phone_number(user: user_dependency, db: db_dependency, new_phone_number: str):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate user')
-    current_user = db.query(Users).filter(Users.id == user['id']).first()
+    current_user = await db.get(Users, user['id'])
     if current_user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='User not found')
     setattr(current_user, 'phone_number', new_phone_number)
-    db.commit()
+    setattr(current_user, 'data_version', Users.data_version + 1)
+    await db.commit()
     # Return 204 No Content for successful phone number change
\ No newline at end of file
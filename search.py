@@ -0,0 +1,51 @@
+"""
+Full-text search over todo titles and descriptions.
+
+Postgres matches the GIN-indexed ``Todos.search_vector`` column (title
+weighted above description) against ``websearch_to_tsquery``, so users can
+type quoted phrases, ``or`` and ``-word``. SQLite, used locally and in the
+tests, matches the ``TodosSearch`` FTS5 table instead and treats every word
+as required. Either way a higher score is a better match.
+"""
+
+import re
+from typing import Optional
+
+from sqlalchemy import column, func, literal_column, select, table
+from sqlalchemy.sql import ColumnElement, Select
+
+from models import Todos
+
+SEARCH_CONFIG = 'english'
+
+_fts_table = table('TodosSearch', column('rowid'))
+_fts_name = literal_column('"TodosSearch"')
+
+
+def _fts5_match(q: str) -> str:
+    # every word quoted, so FTS5 operators and column filters in user input are taken literally
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', q))
+
+
+def search_query(dialect: str, owner_id: int, q: str, columns) -> tuple[Optional[Select], Optional[ColumnElement]]:
+    """SELECT of ``columns`` for the owner's todos matching ``q``, and the score expression.
+
+    Returns ``(None, None)`` when ``q`` holds no searchable words.
+    """
+    if not re.search(r'\w', q):
+        return None, None
+
+    if dialect == 'postgresql':
+        tsquery = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'"), q)
+        score = func.ts_rank(Todos.search_vector, tsquery)
+        query = select(*columns, score.label('score')).where(
+            Todos.owner_id == owner_id, Todos.search_vector.op('@@')(tsquery)
+        )
+        return query, score
+
+    # bm25 is lower for better matches; the weights rank title hits above description hits
+    score = -func.bm25(_fts_name, 2.0, 1.0)
+    query = select(*columns, score.label('score')).join(_fts_table, _fts_table.c.rowid == Todos.id).where(
+        Todos.owner_id == owner_id, _fts_name.op('MATCH')(_fts5_match(q))
+    )
+    return query, score
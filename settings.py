@@ -0,0 +1,31 @@
+"""
+Settings shared by the app, read from the environment once.
+
+``get_settings()`` loads ``.env`` and parses the variables on its first call
+and returns the same object afterwards, so importing a module no longer
+re-reads them. Tuning knobs that belong to one module (pool sizes, cache
+sizes, throttling) are still read next to the code they configure.
+"""
+
+import os
+from datetime import timedelta
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+class Settings:
+    def __init__(self):
+        self.testing = os.getenv("TESTING") in ["true", "1"]
+        self.database_url: Optional[str] = os.getenv("DATABASE_URL")
+        self.async_database_url: Optional[str] = os.getenv("ASYNC_DATABASE_URL")
+        self.secret_key: Optional[str] = os.getenv("SECRET_KEY")
+        self.access_token_expiry = timedelta(minutes=int(os.getenv("ACCESS_TOKEN_MINUTES", "20")))
+        self.refresh_token_expiry = timedelta(days=int(os.getenv("REFRESH_TOKEN_DAYS", "30")))
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    load_dotenv()
+    return Settings()
@@ -2,25 +2,40 @@
 class TodoApp {
     constructor() {
         this.token = localStorage.getItem('token');
+        this.refreshToken = localStorage.getItem('refreshToken');
+        this.tokenExpiresAt = Number(localStorage.getItem('tokenExpiresAt') || 0);
+        this.refreshTimer = null;
+        this.refreshing = null;
         this.user = JSON.parse(localStorage.getItem('user') || 'null');
         this.todos = [];
         this.currentFilter = 'all';
+        this.searchQuery = '';
+        this.searchTimer = null;
         this.currentTodoId = null;
+        this.nextCursor = null;
+        this.loadingPage = false;
+        this.pageGeneration = 0;
+        this.pageSize = 50;
+        this.etagCache = new Map();
+        this.eventsController = null;
         
         this.init();
     }
 
     init() {
         this.setupEventListeners();
+        this.setupInfiniteScroll();
         this.checkAuth();
     }
 
     // Authentication Methods
     checkAuth() {
         if (this.token && this.user) {
+            this.scheduleRefresh();
             this.showMainApp();
             this.loadUserData();
             this.loadTodos();
+            this.connectEvents();
         } else {
             this.showAuthSection();
         }
@@ -40,16 +55,15 @@ class TodoApp {
 
             if (response.ok) {
                 const data = await response.json();
-                this.token = data.access_token;
                 this.user = { username: username }; // Store basic user info
-                
-                localStorage.setItem('token', this.token);
+                this.storeTokens(data);
                 localStorage.setItem('user', JSON.stringify(this.user));
                 
                 this.showNotification('Login successful!', 'success');
                 this.showMainApp();
                 this.loadUserData();
                 this.loadTodos();
+                this.connectEvents();
             } else {
                 const error = await response.json();
                 throw new Error(error.detail || 'Login failed');
@@ -81,18 +95,73 @@ class TodoApp {
         }
     }
 
+    storeTokens(data) {
+        this.token = data.access_token;
+        this.refreshToken = data.refresh_token;
+        this.tokenExpiresAt = Date.now() + data.expires_in * 1000;
+        localStorage.setItem('token', this.token);
+        localStorage.setItem('refreshToken', this.refreshToken);
+        localStorage.setItem('tokenExpiresAt', String(this.tokenExpiresAt));
+        this.scheduleRefresh();
+    }
+
+    // Swap the refresh token for a new pair a minute before the access token runs out
+    scheduleRefresh() {
+        clearTimeout(this.refreshTimer);
+        if (!this.refreshToken) return;
+        const delay = Math.max(this.tokenExpiresAt - Date.now() - 60000, 0);
+        this.refreshTimer = setTimeout(() => this.refreshSession(), delay);
+    }
+
+    // Shared by the timer and by requests that got a 401, so only one refresh is in flight
+    refreshSession() {
+        if (!this.refreshing) {
+            this.refreshing = (async () => {
+                try {
+                    if (!this.refreshToken) return false;
+                    const response = await fetch('/auth/refresh', {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({ refresh_token: this.refreshToken })
+                    });
+                    if (!response.ok) return false;
+                    this.storeTokens(await response.json());
+                    return true;
+                } catch (error) {
+                    return false;
+                } finally {
+                    this.refreshing = null;
+                }
+            })();
+        }
+        return this.refreshing;
+    }
+
     logout() {
+        if (this.refreshToken) {
+            fetch('/auth/logout', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ refresh_token: this.refreshToken })
+            }).catch(() => {});
+        }
+        clearTimeout(this.refreshTimer);
         localStorage.removeItem('token');
+        localStorage.removeItem('refreshToken');
+        localStorage.removeItem('tokenExpiresAt');
         localStorage.removeItem('user');
         this.token = null;
+        this.refreshToken = null;
         this.user = null;
         this.todos = [];
+        this.etagCache.clear();
+        this.disconnectEvents();
         this.showAuthSection();
         this.showNotification('Logged out successfully', 'success');
     }
 
     // API Helper Methods
-    async makeAuthenticatedRequest(url, options = {}) {
+    async makeAuthenticatedRequest(url, options = {}, retried = false) {
         const headers = {
             'Authorization': `Bearer ${this.token}`,
             'Content-Type': 'application/json',
@@ -104,6 +173,9 @@ class TodoApp {
             headers
         });
 
+        if (response.status === 401 && !retried && await this.refreshSession()) {
+            return this.makeAuthenticatedRequest(url, options, true);
+        }
         if (response.status === 401) {
             this.logout();
             throw new Error('Session expired. Please login again.');
@@ -112,12 +184,125 @@ class TodoApp {
         return response;
     }
 
+    // Conditional GET: sends the stored ETag and replays the stored body on 304
+    async fetchWithETag(url) {
+        const cached = this.etagCache.get(url);
+        const response = await this.makeAuthenticatedRequest(url, {
+            cache: 'no-store',
+            headers: cached ? { 'If-None-Match': cached.etag } : {}
+        });
+
+        if (response.status === 304 && cached) {
+            return { ok: true, data: cached.data, headers: cached.headers };
+        }
+        if (!response.ok) {
+            return { ok: false, data: null, headers: response.headers };
+        }
+
+        const data = await response.json();
+        const etag = response.headers.get('ETag');
+        if (etag) {
+            this.etagCache.delete(url);
+            this.etagCache.set(url, { etag, data, headers: response.headers });
+            if (this.etagCache.size > 100) {
+                this.etagCache.delete(this.etagCache.keys().next().value);
+            }
+        }
+        return { ok: true, data, headers: response.headers };
+    }
+
+    // Live updates: a fetch-based server-sent events reader, since EventSource can't send the token
+    async connectEvents() {
+        if (this.eventsController || !this.token) return;
+        const controller = new AbortController();
+        this.eventsController = controller;
+
+        try {
+            const response = await fetch('/events/todos', {
+                headers: { 'Authorization': `Bearer ${this.token}` },
+                signal: controller.signal
+            });
+            if (!response.ok || !response.body) throw new Error('Event stream unavailable');
+
+            const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += value;
+
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const message = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    const data = message.split('\n')
+                        .filter(line => line.startsWith('data:'))
+                        .map(line => line.slice(5).trim())
+                        .join('\n');
+                    if (data) this.applyEvent(JSON.parse(data));
+                }
+            }
+        } catch (error) {
+            if (!controller.signal.aborted) console.error('Event stream error:', error);
+        } finally {
+            if (this.eventsController === controller) this.eventsController = null;
+        }
+
+        // Reconnect and reload, since events sent while disconnected are lost
+        if (!controller.signal.aborted && this.token) {
+            setTimeout(() => {
+                this.loadTodos();
+                this.connectEvents();
+            }, 3000);
+        }
+    }
+
+    disconnectEvents() {
+        if (this.eventsController) {
+            this.eventsController.abort();
+            this.eventsController = null;
+        }
+    }
+
+    applyEvent(event) {
+        switch (event.type) {
+            case 'todo.created':
+            case 'todo.updated':
+                this.upsertLocalTodo(event.todo);
+                break;
+            case 'todo.deleted':
+                this.todos = this.todos.filter(t => t.id !== event.id);
+                this.renderTodos();
+                break;
+            case 'resync':
+                this.loadTodos();
+                return;
+            default:
+                return;
+        }
+        this.updateStats();
+    }
+
+    // Replaces a todo in the list, or inserts it in id order if it belongs to the loaded pages
+    upsertLocalTodo(todo) {
+        const index = this.todos.findIndex(t => t.id === todo.id);
+        if (!this.matchesFilter(todo)) {
+            if (index !== -1) this.todos.splice(index, 1);
+        } else if (index !== -1) {
+            this.todos[index] = todo;
+        } else if (!this.searchQuery && (!this.nextCursor || this.todos.some(t => t.id > todo.id))) {
+            const position = this.todos.findIndex(t => t.id > todo.id);
+            this.todos.splice(position === -1 ? this.todos.length : position, 0, todo);
+        }
+        this.renderTodos();
+    }
+
     // User Data Methods
     async loadUserData() {
         try {
-            const response = await this.makeAuthenticatedRequest('/users/user-info');
+            const response = await this.fetchWithETag('/users/user-info');
             if (response.ok) {
-                const userData = await response.json();
+                const userData = response.data;
                 this.user = { ...this.user, ...userData };
                 localStorage.setItem('user', JSON.stringify(this.user));
                 this.updateUserDisplay();
@@ -184,16 +369,63 @@ class TodoApp {
     }
 
     // Todo Methods
+    getFilterParams() {
+        const params = new URLSearchParams({ limit: this.pageSize });
+        if (this.searchQuery) {
+            // search results are ranked by the server, the status filters don't apply
+            params.set('q', this.searchQuery);
+            return params;
+        }
+        switch (this.currentFilter) {
+            case 'pending':
+                params.set('complete', 'false');
+                break;
+            case 'completed':
+                params.set('complete', 'true');
+                break;
+            case 'high':
+                params.set('min_priority', '4');
+                break;
+        }
+        return params;
+    }
+
+    // Loads the first page for the current filter and resets scrolling
     async loadTodos() {
+        this.nextCursor = null;
+        this.todos = [];
+        await this.loadNextPage(true);
+    }
+
+    async loadNextPage(reset = false) {
+        // a reset (new filter, search or resync) always runs and supersedes any page in flight;
+        // appends wait for the current load and are dropped once a newer reset started
+        if (!reset && (this.loadingPage || !this.nextCursor)) return;
+        const generation = reset ? ++this.pageGeneration : this.pageGeneration;
+        this.loadingPage = true;
+
         try {
-            const response = await this.makeAuthenticatedRequest('/todos/');
+            const params = this.getFilterParams();
+            if (!reset) params.set('cursor', this.nextCursor);
+
+            const path = this.searchQuery ? '/todos/search' : '/todos/';
+            const response = await this.fetchWithETag(`${path}?${params}`);
+            if (generation !== this.pageGeneration) return;
             if (response.ok) {
-                this.todos = await response.json();
-                this.renderTodos();
-                this.updateStats();
+                const page = response.data;
+                this.nextCursor = response.headers.get('X-Next-Cursor');
+                this.todos = reset ? page : this.todos.concat(page);
+                if (reset) {
+                    this.renderTodos();
+                    this.updateStats();
+                } else {
+                    this.appendTodos(page);
+                }
             }
         } catch (error) {
-            this.showNotification(error.message, 'error');
+            if (generation === this.pageGeneration) this.showNotification(error.message, 'error');
+        } finally {
+            if (generation === this.pageGeneration) this.loadingPage = false;
         }
     }
 
@@ -205,8 +437,11 @@ class TodoApp {
             });
 
             if (response.ok) {
+                const { todo } = await response.json();
+                // the live event for this todo may arrive first, upserting keeps it single
+                this.upsertLocalTodo(todo);
+                this.updateStats();
                 this.showNotification('Todo created successfully!', 'success');
-                this.loadTodos();
                 this.closeModal('todo-modal');
             } else {
                 const error = await response.json();
@@ -217,29 +452,83 @@ class TodoApp {
         }
     }
 
-    async updateTodo(todoId, todoData) {
+    matchesFilter(todo) {
+        switch (this.currentFilter) {
+            case 'pending':
+                return !todo.complete;
+            case 'completed':
+                return todo.complete;
+            case 'high':
+                return todo.priority >= 4;
+            default:
+                return true;
+        }
+    }
+
+    // Applies a change (or a removal when changes is null) to the local list right away
+    // and returns a function that puts the previous todo back
+    applyLocalChange(todoId, changes) {
+        const index = this.todos.findIndex(t => t.id === todoId);
+        if (index === -1) return () => {};
+
+        const previous = this.todos[index];
+        const updated = changes === null ? null : { ...previous, ...changes };
+        if (updated && this.matchesFilter(updated)) {
+            this.todos[index] = updated;
+        } else {
+            this.todos.splice(index, 1);
+        }
+        this.renderTodos();
+
+        return () => {
+            const current = this.todos.findIndex(t => t.id === todoId);
+            if (current === -1) {
+                this.todos.splice(Math.min(index, this.todos.length), 0, previous);
+            } else {
+                this.todos[current] = previous;
+            }
+            this.renderTodos();
+        };
+    }
+
+    // Optimistic PATCH of the changed fields, rolled back if the server refuses it
+    async patchTodo(todoId, changes, successMessage = null) {
+        const rollback = this.applyLocalChange(todoId, changes);
         try {
             const response = await this.makeAuthenticatedRequest(`/todos/${todoId}`, {
-                method: 'PUT',
-                body: JSON.stringify(todoData)
+                method: 'PATCH',
+                body: JSON.stringify(changes)
             });
 
             if (response.ok) {
-                this.showNotification('Todo updated successfully!', 'success');
-                this.loadTodos();
-                this.closeModal('todo-modal');
+                if (successMessage) this.showNotification(successMessage, 'success');
+                this.updateStats();
             } else {
                 const error = await response.json();
                 throw new Error(error.detail || 'Failed to update todo');
             }
         } catch (error) {
+            rollback();
             this.showNotification(error.message, 'error');
         }
     }
 
+    async updateTodo(todoId, todoData) {
+        const todo = this.todos.find(t => t.id === todoId);
+        const changes = {};
+        Object.entries(todoData).forEach(([key, value]) => {
+            if (!todo || todo[key] !== value) changes[key] = value;
+        });
+
+        this.closeModal('todo-modal');
+        if (Object.keys(changes).length === 0) return;
+        await this.patchTodo(todoId, changes, 'Todo updated successfully!');
+    }
+
     async deleteTodo(todoId) {
         if (!confirm('Are you sure you want to delete this todo?')) return;
 
+        const rollback = this.applyLocalChange(todoId, null);
         try {
             const response = await this.makeAuthenticatedRequest(`/todos/${todoId}`, {
                 method: 'DELETE'
@@ -247,25 +536,19 @@ class TodoApp {
 
             if (response.ok) {
                 this.showNotification('Todo deleted successfully!', 'success');
-                this.loadTodos();
+                this.updateStats();
             } else {
                 const error = await response.json();
                 throw new Error(error.detail || 'Failed to delete todo');
             }
         } catch (error) {
+            rollback();
             this.showNotification(error.message, 'error');
         }
     }
 
     async toggleTodoComplete(todoId, completed) {
-        const todo = this.todos.find(t => t.id === todoId);
-        if (!todo) return;
-
-        const updatedTodo = { ...todo, complete: completed };
-        delete updatedTodo.id;
-        delete updatedTodo.owner_id;
-
-        await this.updateTodo(todoId, updatedTodo);
+        await this.patchTodo(todoId, { complete: completed });
     }
 
     // Admin Methods
@@ -307,22 +590,8 @@ class TodoApp {
         const todoList = document.getElementById('todo-list');
         const emptyState = document.getElementById('empty-todos');
 
-        let filteredTodos = this.todos;
-
-        // Apply filters
-        switch (this.currentFilter) {
-            case 'pending':
-                filteredTodos = this.todos.filter(todo => !todo.complete);
-                break;
-            case 'completed':
-                filteredTodos = this.todos.filter(todo => todo.complete);
-                break;
-            case 'high':
-                filteredTodos = this.todos.filter(todo => todo.priority >= 4);
-                break;
-        }
-
-        if (filteredTodos.length === 0) {
+        // Todos are already filtered by the server
+        if (this.todos.length === 0) {
             emptyState.style.display = 'block';
             todoList.innerHTML = '';
             todoList.appendChild(emptyState);
@@ -331,11 +600,16 @@ class TodoApp {
 
         emptyState.style.display = 'none';
         todoList.innerHTML = '';
+        this.appendTodos(this.todos);
+    }
 
-        filteredTodos.forEach(todo => {
-            const todoElement = this.createTodoElement(todo);
-            todoList.appendChild(todoElement);
+    appendTodos(todos) {
+        const todoList = document.getElementById('todo-list');
+        const fragment = document.createDocumentFragment();
+        todos.forEach(todo => {
+            fragment.appendChild(this.createTodoElement(todo));
         });
+        todoList.appendChild(fragment);
     }
 
     createTodoElement(todo) {
@@ -406,14 +680,19 @@ class TodoApp {
         return todoDiv;
     }
 
-    updateStats() {
-        const total = this.todos.length;
-        const completed = this.todos.filter(todo => todo.complete).length;
-        const pending = total - completed;
+    // Counts come from the server so they cover every todo, not just the loaded pages
+    async updateStats() {
+        try {
+            const response = await this.fetchWithETag('/todos/stats');
+            if (!response.ok) return;
 
-        document.getElementById('total-todos').textContent = total;
-        document.getElementById('completed-todos').textContent = completed;
-        document.getElementById('pending-todos').textContent = pending;
+            const stats = response.data;
+            document.getElementById('total-todos').textContent = stats.total;
+            document.getElementById('completed-todos').textContent = stats.completed;
+            document.getElementById('pending-todos').textContent = stats.pending;
+        } catch (error) {
+            console.error('Error loading stats:', error);
+        }
     }
 
     // UI Helper Methods
@@ -521,6 +800,19 @@ class TodoApp {
         }, 5000);
     }
 
+    // Fetch the next page when the end of the list scrolls into view
+    setupInfiniteScroll() {
+        const sentinel = document.getElementById('todo-list-sentinel');
+        if (!sentinel || !('IntersectionObserver' in window)) return;
+
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting) && this.token) {
+                this.loadNextPage();
+            }
+        }, { rootMargin: '200px' });
+        observer.observe(sentinel);
+    }
+
     // Event Listeners Setup
     setupEventListeners() {
         // Auth form switching
@@ -597,9 +889,7 @@ class TodoApp {
             };
 
             if (this.currentTodoId) {
-                // For updates, we need to include the complete status
-                const currentTodo = this.todos.find(t => t.id === this.currentTodoId);
-                todoData.complete = currentTodo ? currentTodo.complete : false;
+                // Only the fields that changed are sent
                 this.updateTodo(this.currentTodoId, todoData);
             } else {
                 // For creation, don't send complete field - let database default handle it
@@ -613,10 +903,19 @@ class TodoApp {
                 document.querySelectorAll('.filter-btn').forEach(b => b.classList.remove('active'));
                 btn.classList.add('active');
                 this.currentFilter = btn.dataset.filter;
-                this.renderTodos();
+                this.loadTodos();
             });
         });
 
+        // Todo search, sent once typing pauses
+        document.getElementById('todo-search').addEventListener('input', (e) => {
+            clearTimeout(this.searchTimer);
+            this.searchTimer = setTimeout(() => {
+                this.searchQuery = e.target.value.trim();
+                this.loadTodos();
+            }, 300);
+        });
+
         // Profile actions
         document.getElementById('change-password-btn').addEventListener('click', () => {
             this.openModal('password-modal');
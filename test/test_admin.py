@@ -2,7 +2,9 @@
 Essential admin tests only
 """
 
+import json
 import pytest
+import counters
 from fastapi import status
 from .utils import get_auth_headers
 
@@ -28,3 +30,30 @@ class TestAdmin:
         headers = get_auth_headers(admin_token)
         response = client.delete(f"/admin/todos/{test_todo.id}", headers=headers)
         assert response.status_code == status.HTTP_204_NO_CONTENT
+    
+    def test_admin_pool_stats(self, client, admin_token, user_token):
+        """Test pool statistics are admin only"""
+        response = client.get("/admin/pool-stats", headers=get_auth_headers(admin_token))
+        assert response.status_code == status.HTTP_200_OK
+        assert {"checked_out", "overflow", "wait_seconds_max"} <= response.json().keys()
+        response = client.get("/admin/pool-stats", headers=get_auth_headers(user_token))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+    
+    def test_admin_export_streams(self, client, admin_token, test_todo):
+        """Test NDJSON and CSV exports with filters"""
+        headers = get_auth_headers(admin_token)
+        response = client.get("/admin/todos?format=ndjson&complete=false", headers=headers)
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert [json.loads(line)["id"] for line in response.text.splitlines()] == [test_todo.id]
+
+        response = client.get(f"/admin/todos?format=csv&owner_id={test_todo.owner_id + 1}", headers=headers)
+        assert response.text.splitlines() == ["id,title,description,priority,complete,owner_id"]
+    
+    def test_admin_stats_after_rebuild(self, client, admin_token, db_session, test_todo):
+        """Test the rebuild reconciles counters for rows written outside the API"""
+        headers = get_auth_headers(admin_token)
+        assert client.get("/admin/stats", headers=headers).json() == []
+
+        assert counters.rebuild(db_session) == 1
+        stats = client.get("/admin/stats", headers=headers).json()
+        assert [(row["owner_id"], row["total"], row["pending"]) for row in stats] == [(test_todo.owner_id, 1, 1)]
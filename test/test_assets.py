@@ -0,0 +1,40 @@
+"""Static asset pipeline tests"""
+
+import gzip
+import re
+from fastapi import status
+import assets
+
+
+def test_build_fingerprints_and_compresses(tmp_path):
+    """Test assets get content-hashed names and stable .gz variants"""
+    source = tmp_path / "static"
+    (source / "js").mkdir(parents=True)
+    (source / "js" / "app.js").write_text("console.log('hi');")
+    output = source / "dist"
+
+    manifest = assets.build(str(source), str(output))
+    hashed = manifest["js/app.js"]
+    assert re.fullmatch(r"js/app\.[0-9a-f]{12}\.js", hashed)
+    assert gzip.decompress((output / f"{hashed}.gz").read_bytes()) == b"console.log('hi');"
+
+    # rebuilding is stable and never fingerprints its own output
+    assert assets.build(str(source), str(output)) == manifest
+    (source / "js" / "app.js").write_text("console.log('changed');")
+    assert assets.build(str(source), str(output))["js/app.js"] != hashed
+
+
+def test_root_serves_immutable_compressed_assets(client):
+    """Test the page links hashed URLs that are served precompressed and cached forever"""
+    page = client.get("/").text
+    script = re.search(r'src="(/assets/js/app\.[0-9a-f]{12}\.js)"', page).group(1)
+
+    response = client.get(script, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Content-Type"].split(";")[0] in ("application/javascript", "text/javascript")
+    assert "immutable" in response.headers["Cache-Control"]
+    assert response.content == open("static/js/app.js", "rb").read()
+
+    plain = client.get(script, headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
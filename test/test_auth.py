@@ -1,8 +1,10 @@
 """Minimal auth endpoint tests"""
 
 import pytest
+from datetime import timedelta
 from fastapi import status
-from .utils import get_auth_headers
+from routers.auth import token_cache
+from .utils import get_auth_headers, create_access_token
 
 
 def test_register_user(client):
@@ -36,4 +38,53 @@ def test_login_fail(client, test_user):
     login_data = {"username": "testuser", "password": "wrongpassword"}
     
     response = client.post("/auth/token", data=login_data)
-    assert response.status_code == status.HTTP_401_UNAUTHORIZED
\ No newline at end of file
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+def test_token_cache(client, user_token):
+    """Test verified claims are cached and bad tokens are never cached"""
+    token_cache.clear()
+    headers = get_auth_headers(user_token)
+    client.get("/users/user-info", headers=headers)
+    client.get("/users/user-info", headers=headers)
+    assert token_cache.stats()["hits"] == 1
+
+    tampered = get_auth_headers(user_token[:-2] + "xx")
+    response = client.get("/users/user-info", headers=tampered)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert len(token_cache) == 1
+
+
+def test_expired_token_rejected(client, test_user):
+    """Test an expired token is rejected"""
+    token = create_access_token(test_user.username, test_user.id, test_user.role, timedelta(seconds=-1))
+    response = client.get("/users/user-info", headers=get_auth_headers(token))
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_refresh_token_rotates(client, test_user, monkeypatch):
+    """Test a refresh token mints a new pair without bcrypt and can't be used twice"""
+    login = client.post("/auth/token", data={"username": "testuser", "password": "testpassword"}).json()
+    assert login["expires_in"] == 20 * 60
+
+    async def no_bcrypt(*args):
+        raise AssertionError("refresh must not verify a password")
+    monkeypatch.setattr("routers.auth.verify_password", no_bcrypt)
+
+    response = client.post("/auth/refresh", json={"refresh_token": login["refresh_token"]})
+    assert response.status_code == status.HTTP_200_OK
+    refreshed = response.json()
+    assert refreshed["refresh_token"] != login["refresh_token"]
+    assert client.get("/users/user-info", headers=get_auth_headers(refreshed["access_token"])).status_code == 200
+
+    # replaying the rotated token revokes the whole family, including the new token
+    replay = client.post("/auth/refresh", json={"refresh_token": login["refresh_token"]})
+    assert replay.status_code == status.HTTP_401_UNAUTHORIZED
+    assert client.post("/auth/refresh", json={"refresh_token": refreshed["refresh_token"]}).status_code == 401
+
+
+def test_logout_revokes_refresh_token(client, test_user):
+    """Test a logged out refresh token is rejected"""
+    login = client.post("/auth/token", data={"username": "testuser", "password": "testpassword"}).json()
+    assert client.post("/auth/logout", json={"refresh_token": login["refresh_token"]}).status_code == 204
+    response = client.post("/auth/refresh", json={"refresh_token": login["refresh_token"]})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
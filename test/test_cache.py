@@ -0,0 +1,55 @@
+"""In-process cache tests"""
+
+import pytest
+from cache import LRUCache, OwnerCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction():
+    """Test the least recently used entry is evicted first"""
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 1
+
+
+def test_expiry_is_exact():
+    """Test entries are never returned at or after their expiry time"""
+    clock = FakeClock()
+    cache = LRUCache(maxsize=10, clock=clock)
+    cache.set("token", {"id": 1}, expires_at=1010)
+    clock.now = 1009.999
+    assert cache.get("token") == {"id": 1}
+    clock.now = 1010
+    assert cache.get("token") is None
+    assert len(cache) == 0
+
+
+def test_incomplete_owner_cache_fails_on_instantiation():
+    """Test a backend missing part of the OwnerCache interface cannot be created"""
+    class NoInvalidate(OwnerCache):
+        def get(self, owner_id, key):
+            return None
+
+        def set(self, owner_id, key, value, generation):
+            pass
+
+        def generation(self, owner_id):
+            return 0
+
+        def clear(self):
+            pass
+
+    with pytest.raises(TypeError, match="invalidate"):
+        NoInvalidate()
@@ -0,0 +1,92 @@
+"""Response compression tests"""
+
+import asyncio
+import zlib
+from fastapi import status
+from starlette.responses import PlainTextResponse, StreamingResponse
+from compression import CompressionMiddleware, accepted_encodings
+from .utils import get_auth_headers
+
+
+def run_asgi(app, accept_encoding="gzip"):
+    """Call an ASGI app directly and collect what it sends"""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    # ASGI 2.4 tells StreamingResponse not to poll receive() for a disconnect
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}, "method": "GET", "path": "/",
+             "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(app(scope, receive, send))
+    return dict((k.decode().lower(), v.decode()) for k, v in messages[0]["headers"]), messages[1:]
+
+
+def test_accepted_encodings_skip_q0():
+    """Test codings refused with q=0 are not used"""
+    assert accepted_encodings("gzip;q=0, br") == {"br"}
+    assert accepted_encodings("") == {""}
+
+
+def test_small_and_unlisted_responses_pass_through():
+    """Test bodies below the threshold and types off the allow-list stay identity encoded"""
+    small = CompressionMiddleware(PlainTextResponse("x" * 10), minimum_size=100)
+    headers, _ = run_asgi(small)
+    assert "content-encoding" not in headers
+
+    image = CompressionMiddleware(PlainTextResponse("x" * 1000, media_type="image/png"), minimum_size=100)
+    headers, _ = run_asgi(image)
+    assert "content-encoding" not in headers
+
+
+def test_messages_before_start_are_forwarded():
+    """Test a message sent before the response start (templates send http.response.debug) passes through"""
+    response = PlainTextResponse("x" * 1000)
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.debug", "info": {}})
+        await response(scope, receive, send)
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=100)(scope, None, send))
+    assert [message["type"] for message in messages] == ["http.response.debug", "http.response.start", "http.response.body"]
+    assert (b"content-encoding", b"gzip") in messages[1]["headers"]
+
+
+def test_streaming_chunks_are_flushed():
+    """Test every streamed chunk can be decoded as soon as it arrives"""
+    async def rows():
+        for i in range(3):
+            yield f'{{"id": {i}}}\n'
+
+    app = CompressionMiddleware(StreamingResponse(rows(), media_type="application/x-ndjson"), minimum_size=100)
+    headers, bodies = run_asgi(app)
+    assert headers["content-encoding"] == "gzip" and "content-length" not in headers
+
+    decoder = zlib.decompressobj(31)
+    decoded = [decoder.decompress(body["body"]) for body in bodies]
+    assert decoded[:3] == [b'{"id": 0}\n', b'{"id": 1}\n', b'{"id": 2}\n']
+    assert bodies[-1]["more_body"] is False
+
+
+def test_large_json_list_is_compressed(client, user_token):
+    """Test the todo list is compressed once it is big enough"""
+    headers = get_auth_headers(user_token)
+    todos = [{"title": f"Todo {i}", "description": "Compress me", "priority": 1} for i in range(50)]
+    client.post("/todos/batch", json=todos, headers=headers)
+
+    response = client.get("/todos", headers={**headers, "Accept-Encoding": "gzip"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(response.json()) == 50
+
+    assert "content-encoding" not in client.get("/healthy", headers={"Accept-Encoding": "gzip"}).headers
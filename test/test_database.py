@@ -0,0 +1,117 @@
+"""Database configuration tests"""
+
+import logging
+import os
+import pytest
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, inspect, text
+import database
+from database import SCHEMA_REVISION, capture_queries, check_schema, parameter_shape, to_async_url
+from .utils import get_auth_headers
+
+
+def test_to_async_url():
+    """Test sync database URLs are mapped to their asyncio drivers"""
+    assert to_async_url("postgresql://u:p@db/todo") == "postgresql+asyncpg://u:p@db/todo"
+    assert to_async_url("postgresql+psycopg2://u:p@db/todo") == "postgresql+asyncpg://u:p@db/todo"
+    assert to_async_url("sqlite:///./test_database.db") == "sqlite+aiosqlite:///./test_database.db"
+
+
+def test_parameter_shape_hides_values():
+    """Test logged parameters show types, never values"""
+    assert parameter_shape({"username": "alice", "id_1": 3}) == "{username: str, id_1: int}"
+    assert parameter_shape([("a", 1), ("b", 2)]) == "2 x (str, int)"
+
+
+def test_query_budget(client, user_token, test_todo):
+    """Test per-request statement counts are exposed for query budgets"""
+    headers = get_auth_headers(user_token)
+    with capture_queries() as requests:
+        client.get("/users/user-info", headers=headers)
+        client.get(f"/todos/{test_todo.id}", headers=headers)
+    assert [(method, path) for method, path, _ in requests] == [("GET", "/users/user-info"), ("GET", f"/todos/{test_todo.id}")]
+    assert requests[0][2].count == 1  # the Users row, claims come from the token
+    assert requests[1][2].count <= 2
+    assert all(stats.seconds > 0 for _, _, stats in requests)
+
+
+def test_repeated_statement_and_slow_query_are_logged(client, user_token, monkeypatch, caplog):
+    """Test statements repeated up to the threshold are flagged as N+1 and slow ones are logged"""
+    headers = get_auth_headers(user_token)
+    monkeypatch.setattr(database, "SLOW_QUERY_SECONDS", 0.0)
+    monkeypatch.setattr(_query_middleware(client), "threshold", 1)
+    with caplog.at_level(logging.WARNING, logger="database"):
+        client.get("/users/user-info", headers=headers)
+    messages = [record.getMessage() for record in caplog.records]
+    assert any(message.startswith("slow query") and "parameters=(int)" in message for message in messages)
+    assert any(message.startswith("possible N+1: GET /users/user-info") for message in messages)
+
+
+def _query_middleware(client):
+    """The QueryAccountingMiddleware instance in the app's built middleware stack"""
+    app = client.app.middleware_stack
+    while not isinstance(app, database.QueryAccountingMiddleware):
+        app = app.app
+    return app
+
+
+def test_schema_revision_is_the_migration_head():
+    """Test SCHEMA_REVISION was bumped along with the latest migration"""
+    config = Config(os.path.join(os.path.dirname(database.__file__), "alembic.ini"))
+    assert ScriptDirectory.from_config(config).get_current_head() == SCHEMA_REVISION
+
+
+def test_check_schema_creates_and_stamps_a_new_database(tmp_path):
+    """Test a database without alembic_version gets the tables and the head revision"""
+    db = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    check_schema(db)
+    with db.connect() as connection:
+        assert connection.scalar(text("SELECT version_num FROM alembic_version")) == SCHEMA_REVISION
+    assert {"Users", "Todos", "RefreshTokens"} <= set(inspect(db).get_table_names())
+
+    # at head, the next start only reads the revision
+    check_schema(db)
+
+
+def test_check_schema_refuses_an_outdated_database(tmp_path):
+    """Test startup fails when migrations are missing instead of serving an old schema"""
+    db = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with db.begin() as connection:
+        connection.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+        connection.execute(text("INSERT INTO alembic_version VALUES ('3d8f5a1c6b24')"))
+    with pytest.raises(RuntimeError, match="alembic upgrade head"):
+        check_schema(db)
+
+
+def test_check_schema_refuses_tables_without_a_revision(tmp_path):
+    """Test a database created before migrations were tracked is not stamped as current"""
+    db = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with db.begin() as connection:
+        # the tables as the app created them before any migration
+        connection.execute(text('CREATE TABLE "Users" (id INTEGER PRIMARY KEY, email VARCHAR UNIQUE, '
+                                'username VARCHAR UNIQUE, first_name VARCHAR, last_name VARCHAR, '
+                                'hashed_password VARCHAR, is_active BOOLEAN, role VARCHAR, phone_number VARCHAR)'))
+        connection.execute(text('CREATE TABLE "Todos" (id INTEGER PRIMARY KEY, title VARCHAR, description VARCHAR, '
+                                'priority INTEGER, complete BOOLEAN, owner_id INTEGER REFERENCES "Users" (id))'))
+    with pytest.raises(RuntimeError, match="alembic stamp 57d3a9e69494 && alembic upgrade head"):
+        check_schema(db)
+    assert "alembic_version" not in inspect(db).get_table_names()
+    assert "TodoStats" not in inspect(db).get_table_names()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_child_gets_fresh_pools():
+    """Test a forked process does not share the parent's pooled connections"""
+    parent_pools = (id(database.engine.pool), id(database.async_engine.sync_engine.pool))
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        fresh = (id(database.engine.pool), id(database.async_engine.sync_engine.pool))
+        os.write(write_end, b"1" if all(a != b for a, b in zip(parent_pools, fresh)) else b"0")
+        os._exit(0)
+    os.close(write_end)
+    result = os.read(read_end, 1)
+    os.close(read_end)
+    os.waitpid(pid, 0)
+    assert result == b"1"
@@ -0,0 +1,23 @@
+"""Query plan checks for the todo indexes"""
+
+import pytest
+from sqlalchemy import text
+
+
+def explain(db_session, sql):
+    rows = db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}"), {"owner_id": 1}).fetchall()
+    return " ".join(row[-1] for row in rows)
+
+
+def test_list_query_uses_owner_id_index(db_session):
+    """Test the paginated todo list is served from (owner_id, id)"""
+    plan = explain(db_session, 'SELECT * FROM "Todos" WHERE owner_id = :owner_id AND id > 10 ORDER BY id LIMIT 50')
+    assert "ix_Todos_owner_id_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_filtered_query_uses_complete_priority_index(db_session):
+    """Test complete/priority filters are served from (owner_id, complete, priority)"""
+    plan = explain(db_session, 'SELECT * FROM "Todos" WHERE owner_id = :owner_id AND complete = 0 ORDER BY priority')
+    assert "ix_Todos_owner_id_complete_priority" in plan
+    assert "TEMP B-TREE" not in plan
@@ -4,6 +4,9 @@ Essential main app tests only
 
 import pytest
 from fastapi import status
+from fastapi.testclient import TestClient
+import assets
+import main
 
 
 class TestMain:
@@ -13,4 +16,14 @@ class TestMain:
         """Test health endpoint works"""
         response = client.get("/healthy")
         assert response.status_code == status.HTTP_200_OK
-        assert response.json() == {"status": "healthy"}
\ No newline at end of file
+        assert response.json() == {"status": "healthy"}
+
+    def test_create_app_runs_startup_in_lifespan(self, db_session, monkeypatch):
+        """Test a factory-built app builds the assets when it starts, not when it is created"""
+        monkeypatch.setattr(assets, "manifest", {})
+        app = main.create_app()
+        assert app is not main.app
+        assert assets.manifest == {}
+        with TestClient(app) as client:
+            assert "js/app.js" in assets.manifest
+            assert client.get("/healthy").json() == {"status": "healthy"}
@@ -0,0 +1,44 @@
+"""Request metrics tests"""
+
+from fastapi import status
+from fastapi.testclient import TestClient
+from starlette.responses import PlainTextResponse
+from metrics import Histogram, MetricsMiddleware, registry, timing
+
+
+def test_histogram_buckets_are_inclusive():
+    """Test a value equal to a bucket bound is counted in that bucket"""
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.counts == [1, 1, 1]
+    assert histogram.count == 3
+
+
+def test_metrics_endpoint(client):
+    """Test requests show up per route template in the Prometheus output"""
+    registry.clear()
+    client.get("/healthy")
+    client.get("/todos/123")
+
+    response = client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/healthy",status="200"} 1' in body
+    assert 'http_requests_total{method="GET",route="/todos/{todo_id}",status="401"} 1' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/healthy"} 1' in body
+    assert "http_requests_in_flight 1" in body
+
+
+def test_server_timing_header():
+    """Test phases timed during the request are reported in Server-Timing"""
+    async def app(scope, receive, send):
+        with timing("db"):
+            response = PlainTextResponse("ok")
+        await response(scope, receive, send)
+
+    response = TestClient(MetricsMiddleware(app, server_timing=True)).get("/")
+    entries = [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+    assert entries == ["db", "app"]
+    assert "server-timing" not in TestClient(MetricsMiddleware(app)).get("/").headers
@@ -0,0 +1,58 @@
+"""Password hashing pool tests"""
+
+import asyncio
+import pytest
+from fastapi import HTTPException, status
+from passwords import PasswordHasher
+
+
+def test_hash_and_verify_on_worker_pool():
+    """Test hashing round-trips through the worker processes"""
+    hasher = PasswordHasher(workers=1, queue_size=1, queue_timeout=5)
+
+    async def scenario():
+        hashed = await hasher.hash("secret")
+        assert await hasher.verify("secret", hashed)
+        assert not await hasher.verify("wrong", hashed)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        hasher.shutdown()
+
+
+def test_saturated_pool_returns_503():
+    """Test a saturated pool rejects instead of queueing forever"""
+    hasher = PasswordHasher(workers=1, queue_size=1, queue_timeout=0.05)
+
+    async def scenario():
+        await hasher._get_slots().acquire()  # the only worker is busy
+        with pytest.raises(HTTPException) as timed_out:
+            await hasher.hash("secret")
+        assert timed_out.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+        hasher.queue_size = 0
+        with pytest.raises(HTTPException) as rejected:
+            await hasher.hash("secret")
+        assert rejected.value.headers["Retry-After"] == "1"
+
+    asyncio.run(scenario())
+
+
+def test_broken_pool_is_replaced():
+    """Test a pool whose worker died is rebuilt instead of failing every later call"""
+    hasher = PasswordHasher(workers=1, queue_size=1, queue_timeout=5)
+
+    async def scenario():
+        hasher.start()
+        broken = hasher._get_executor()
+        for process in list(broken._processes.values()):
+            process.kill()
+        hashed = await hasher.hash("secret")
+        assert hasher._executor is not broken
+        assert await hasher.verify("secret", hashed)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,71 @@
+"""On-demand request profiling tests"""
+
+import threading
+import time
+from fastapi import status
+from profiling import ProfilerMiddleware, Sampler
+from .utils import get_auth_headers
+
+
+def _busy_loop(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(100))
+
+
+def _profiler(client) -> ProfilerMiddleware:
+    app = client.app.middleware_stack
+    while not isinstance(app, ProfilerMiddleware):
+        app = app.app
+    return app
+
+
+def test_sampler_collapses_stacks():
+    """Test samples of another thread come out as root-first collapsed stack lines"""
+    worker = threading.Thread(target=_busy_loop, args=(0.2,))
+    worker.start()
+    sampler = Sampler(worker.ident, interval=0.001).start()
+    worker.join()
+    sampler.stop()
+
+    lines = sampler.report().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert stack.startswith("threading:Thread._bootstrap")
+    assert any("test.test_profiling:_busy_loop" in line for line in lines)
+
+
+def test_admin_gets_profile_instead_of_response(client, admin_token, monkeypatch):
+    """Test an admin's X-Profile request returns collapsed stacks and the original status"""
+    monkeypatch.setattr(_profiler(client), "interval", 0.0005)
+    response = client.get("/admin/todos", headers={**get_auth_headers(admin_token), "X-Profile": "1"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.headers["x-profile-status"] == "200"
+    for line in response.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert ";" in stack and int(count) > 0
+
+
+def test_profile_flag_is_ignored_for_other_users(client, user_token):
+    """Test the flag from a non-admin or without a token leaves the response alone"""
+    response = client.get("/users/user-info?profile=1", headers=get_auth_headers(user_token))
+    assert response.status_code == status.HTTP_200_OK
+    assert "x-profile-status" not in response.headers
+    assert response.json()["Username"] == "testuser"
+
+    response = client.get("/healthy", headers={"X-Profile": "1"})
+    assert response.json() == {"status": "healthy"}
+
+
+def test_sampled_requests_are_written_to_disk(client, monkeypatch, tmp_path):
+    """Test PROFILE_SAMPLE_RATE profiles requests to files without touching the response"""
+    profiler = _profiler(client)
+    monkeypatch.setattr(profiler, "sample_rate", 1.0)
+    monkeypatch.setattr(profiler, "directory", str(tmp_path))
+    response = client.get("/healthy")
+    assert response.json() == {"status": "healthy"}
+    files = list(tmp_path.iterdir())
+    assert len(files) == 1
+    assert files[0].name.endswith("-GET-healthy.collapsed")
@@ -0,0 +1,146 @@
+"""Todo change feed tests"""
+
+import asyncio
+import httpx
+from fastapi import status
+from database import async_engine
+from pubsub import Broker, todo_events
+from .utils import get_auth_headers
+import main
+
+
+def test_publish_reaches_only_the_owner():
+    """Test events are delivered to the owner's subscribers only"""
+    async def scenario():
+        broker = Broker(queue_size=10)
+        mine, other = broker.subscribe(1), broker.subscribe(2)
+        assert broker.publish(1, {"type": "todo.deleted", "id": 5}) == 1
+        assert await mine.get(timeout=1) == {"type": "todo.deleted", "id": 5}
+        try:
+            await other.get(timeout=0.01)
+            assert False, "other user received an event"
+        except asyncio.TimeoutError:
+            pass
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_is_evicted():
+    """Test a full queue evicts its subscriber without blocking the publisher"""
+    async def scenario():
+        broker = Broker(queue_size=2)
+        slow = broker.subscribe(1)
+        for i in range(3):
+            broker.publish(1, {"type": "todo.deleted", "id": i})
+        assert slow.evicted
+        assert await slow.get(timeout=1) is None
+        assert broker.stats()["subscribers"] == 0 and broker.stats()["evictions"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_todo_writes_publish_events(client, user_token, test_user):
+    """Test create, update and delete publish events for the owner"""
+    subscription = todo_events.subscribe(test_user.id)
+    try:
+        headers = get_auth_headers(user_token)
+        todo = client.post("/todos", json={"title": "Live", "description": "Live", "priority": 1},
+                           headers=headers).json()["todo"]
+        client.patch(f"/todos/{todo['id']}", json={"complete": True}, headers=headers)
+        assert client.delete(f"/todos/{todo['id']}", headers=headers).status_code == status.HTTP_204_NO_CONTENT
+
+        events = [subscription._queue.get_nowait() for _ in range(3)]
+        assert [event["type"] for event in events] == ["todo.created", "todo.updated", "todo.deleted"]
+        assert events[1]["todo"]["complete"] is True and events[2]["id"] == todo["id"]
+    finally:
+        todo_events.unsubscribe(subscription)
+
+
+class _EventStream:
+    """Drives GET /events/todos on the ASGI app directly; TestClient would wait for the endless body"""
+
+    def __init__(self, headers: dict):
+        self.headers = headers
+        self.messages: asyncio.Queue = asyncio.Queue()
+        self.disconnected = asyncio.Event()
+        self.buffer = ""
+        self.ended = False
+
+    async def __aenter__(self):
+        scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+                 "method": "GET", "scheme": "http", "path": "/events/todos", "raw_path": b"/events/todos",
+                 "root_path": "", "query_string": b"", "client": ("testclient", 50000), "server": ("testserver", 80),
+                 "headers": [(b"host", b"testserver")] + [(name.lower().encode(), value.encode())
+                                                          for name, value in self.headers.items()]}
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await self.disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        self.task = asyncio.create_task(main.app(scope, receive, self.messages.put))
+        self.start = await asyncio.wait_for(self.messages.get(), timeout=5)
+        return self
+
+    async def read_until(self, text: str) -> str:
+        while text not in self.buffer and not self.ended:
+            message = await asyncio.wait_for(self.messages.get(), timeout=5)
+            self.buffer += message.get("body", b"").decode()
+            self.ended = not message.get("more_body", False)
+        return self.buffer
+
+    async def __aexit__(self, *exc_info):
+        self.disconnected.set()
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        # connections opened on this loop must not be reused by the next test's loop
+        await async_engine.dispose()
+
+
+def test_event_stream_requires_a_token(client):
+    """Test anonymous clients cannot open the change feed"""
+    assert client.get("/events/todos").status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_event_stream_delivers_created_todo(db_session, user_token):
+    """Test a todo created while the stream is open arrives as a todo.created SSE frame"""
+    headers = get_auth_headers(user_token)
+
+    async def scenario():
+        async with _EventStream(headers) as stream:
+            assert stream.start["status"] == status.HTTP_200_OK
+            assert (b"content-type", b"text/event-stream; charset=utf-8") in stream.start["headers"]
+            assert (await stream.read_until("\n\n")).startswith("retry: 3000\n\n")
+
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as api:
+                response = await api.post("/todos/", json={"title": "Live", "description": "Live", "priority": 1},
+                                          headers=headers)
+            todo_id = response.json()["todo"]["id"]
+
+            body = await stream.read_until("event: todo.created")
+            frame = body.split("event: todo.created\n", 1)[1].split("\n\n", 1)[0]
+            assert frame.startswith("data: {")
+            assert f'"id":{todo_id}' in frame and '"title":"Live"' in frame
+
+    asyncio.run(scenario())
+
+
+def test_event_stream_ends_with_resync_on_overflow(db_session, user_token, test_user):
+    """Test a client that falls a whole queue behind gets resync and the stream ends"""
+    async def scenario():
+        async with _EventStream(get_auth_headers(user_token)) as stream:
+            await stream.read_until("retry")
+            for i in range(todo_events.queue_size + 1):
+                todo_events.publish(test_user.id, {"type": "todo.deleted", "id": i})
+            body = await stream.read_until("event: resync")
+            assert body.endswith('event: resync\ndata: {"type":"resync"}\n\n')
+            while not stream.ended:
+                await stream.read_until("never sent")
+            assert "todo.deleted" not in body
+
+    asyncio.run(scenario())
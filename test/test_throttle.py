@@ -0,0 +1,63 @@
+"""Login throttling tests"""
+
+from fastapi import status
+from throttle import TokenBucketLimiter
+from .test_cache import FakeClock
+
+
+def make_limiter(clock, **options):
+    settings = dict(rate=1, burst=2, lockout_threshold=3, lockout_base=10, lockout_max=40, maxsize=100)
+    settings.update(options)
+    return TokenBucketLimiter(clock=clock, **settings)
+
+
+def test_bucket_refills():
+    """Test a key gets `burst` attempts and then one per 1/rate seconds"""
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+    assert limiter.acquire("a") is None
+    assert limiter.acquire("a") is None
+    assert limiter.acquire("a") == 1
+    clock.now += 1
+    assert limiter.acquire("a") is None
+    assert limiter.acquire("b") is None
+
+
+def test_lockout_backs_off_and_success_clears():
+    """Test lockouts start at the threshold, double per failure and are capped"""
+    clock = FakeClock()
+    limiter = make_limiter(clock, burst=100)
+    for _ in range(2):
+        limiter.failure("a")
+    assert limiter.acquire("a") is None
+    limiter.failure("a")
+    assert limiter.acquire("a") == 10
+    limiter.failure("a")
+    assert limiter.acquire("a") == 20
+    limiter.failure("a")
+    limiter.failure("a")
+    assert limiter.acquire("a") == 40
+    limiter.success("a")
+    assert limiter.acquire("a") is None
+
+
+def test_state_is_bounded():
+    """Test the least recently seen keys are evicted"""
+    limiter = make_limiter(FakeClock(), maxsize=2)
+    for key in ("a", "b", "c"):
+        limiter.acquire(key)
+    assert len(limiter) == 2
+
+
+def test_login_throttled_before_db(client, test_user, monkeypatch):
+    """Test refused logins get a 429 without running authentication"""
+    login_data = {"username": "testuser", "password": "wrong"}
+    for _ in range(5):
+        assert client.post("/auth/token", data=login_data).status_code == status.HTTP_401_UNAUTHORIZED
+
+    async def fail(*args):
+        raise AssertionError("authenticate_user should not run")
+    monkeypatch.setattr("routers.auth.authenticate_user", fail)
+    response = client.post("/auth/token", data={"username": "TestUser", "password": "testpassword"})
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response.headers["retry-after"]) >= 1
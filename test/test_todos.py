@@ -2,6 +2,9 @@
 
 import pytest
 from fastapi import status
+import counters
+from database import capture_queries
+from models import Todos
 from .utils import get_auth_headers
 
 
@@ -51,4 +54,222 @@ def test_delete_todo(client, user_token, test_todo):
     """Test deleting a todo"""
     headers = get_auth_headers(user_token)
     response = client.delete(f"/todos/{test_todo.id}", headers=headers)
-    assert response.status_code == status.HTTP_204_NO_CONTENT
\ No newline at end of file
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+def test_get_todos_paginated(client, user_token, db_session, test_user):
+    """Test keyset pagination returns every todo once across pages"""
+    for i in range(5):
+        db_session.add(Todos(title=f"Todo {i}", description="Paged", priority=i + 1,
+                             complete=False, owner_id=test_user.id))
+    db_session.commit()
+
+    headers = get_auth_headers(user_token)
+    response = client.get("/todos/?limit=2&sort=-priority", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    seen = [todo["priority"] for todo in response.json()]
+    while "X-Next-Cursor" in response.headers:
+        cursor = response.headers["X-Next-Cursor"]
+        response = client.get(f"/todos/?limit=2&sort=-priority&cursor={cursor}", headers=headers)
+        seen += [todo["priority"] for todo in response.json()]
+    assert seen == [5, 4, 3, 2, 1]
+
+
+def test_get_todos_filtered(client, user_token, test_todo):
+    """Test server-side complete filter and invalid cursors"""
+    headers = get_auth_headers(user_token)
+    response = client.get("/todos/?complete=true", headers=headers)
+    assert response.json() == []
+    response = client.get("/todos/?complete=false", headers=headers)
+    assert [todo["id"] for todo in response.json()] == [test_todo.id]
+    response = client.get("/todos/?cursor=not-a-cursor", headers=headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_todo_list_cache_invalidated_by_writes(client, user_token, db_session, test_user, test_todo):
+    """Test list reads are cached until the owner writes through the API"""
+    headers = get_auth_headers(user_token)
+    assert len(client.get("/todos/", headers=headers).json()) == 1
+
+    # a row written behind the API's back is not visible while cached
+    db_session.add(Todos(title="Hidden", description="Direct insert", priority=1,
+                         complete=False, owner_id=test_user.id))
+    db_session.commit()
+    assert len(client.get("/todos/", headers=headers).json()) == 1
+
+    client.post("/todos", json={"title": "New", "description": "Via API", "priority": 2}, headers=headers)
+    assert len(client.get("/todos/", headers=headers).json()) == 3
+
+
+def test_todo_list_etag(client, user_token, test_todo):
+    """Test If-None-Match gets a 304 until the owner writes"""
+    headers = get_auth_headers(user_token)
+    etag = client.get("/todos/", headers=headers).headers["ETag"]
+    assert etag.startswith('W/"')
+
+    response = client.get("/todos/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    client.delete(f"/todos/{test_todo.id}", headers=headers)
+    response = client.get("/todos/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == []
+
+
+def test_batch_create_update_delete(client, user_token, test_todo):
+    """Test batch endpoints apply every item and report per-item results"""
+    headers = get_auth_headers(user_token)
+    new_todos = [{"title": f"Batch {i}", "description": "Synced", "priority": 3} for i in range(3)]
+    response = client.post("/todos/batch", json=new_todos, headers=headers)
+    assert response.status_code == status.HTTP_201_CREATED
+    ids = [result["id"] for result in response.json()["results"]]
+    assert len(set(ids)) == 3
+
+    updates = [{"id": ids[0], "title": "Done", "description": "Synced", "priority": 1, "complete": True},
+               {"id": 9999, "title": "Missing", "description": "Synced", "priority": 1, "complete": True}]
+    response = client.put("/todos/batch", json=updates, headers=headers)
+    assert [result["status"] for result in response.json()["results"]] == [200, 404]
+    assert client.get(f"/todos/{ids[0]}", headers=headers).json()["complete"] is True
+
+    response = client.request("DELETE", "/todos/batch", json={"ids": ids[1:] + [9999]}, headers=headers)
+    assert [result["status"] for result in response.json()["results"]] == [204, 204, 404]
+    assert len(client.get("/todos/", headers=headers).json()) == 2
+
+
+def test_todo_response_bodies(client, user_token, test_user):
+    """Test the exact JSON of a todo, a list page and a write, so model changes can't alter the API unnoticed"""
+    headers = get_auth_headers(user_token)
+    created = client.post("/todos", json={"title": "A", "description": "First", "priority": 2}, headers=headers)
+    assert created.headers["content-type"] == "application/json"
+    first = created.json()["todo"]["id"]
+    assert created.text == ('{"message":"Todo created successfully","todo":'
+                            f'{{"id":{first},"title":"A","description":"First","priority":2,"complete":false,'
+                            f'"owner_id":{test_user.id}}}}}')
+    second = client.post("/todos", json={"title": "B", "description": "Second", "priority": 5}, headers=headers).json()["todo"]["id"]
+
+    response = client.get(f"/todos/{second}", headers=headers)
+    assert response.headers["content-type"] == "application/json"
+    assert response.text == (f'{{"id":{second},"title":"B","description":"Second","priority":5,"complete":false,'
+                             f'"owner_id":{test_user.id}}}')
+
+    response = client.get("/todos/?limit=1", headers=headers)
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["x-next-cursor"]
+    assert response.text == (f'[{{"id":{first},"title":"A","description":"First","priority":2,"complete":false,'
+                             f'"owner_id":{test_user.id}}}]')
+
+
+def test_repeated_updates_keep_stats_exact(client, user_token, db_session):
+    """Test updating one todo again and again leaves the counters equal to a fresh rebuild"""
+    headers = get_auth_headers(user_token)
+    todo_id = client.post("/todos", json={"title": "T", "description": "D", "priority": 1}, headers=headers).json()["todo"]["id"]
+    url = f"/todos/{todo_id}"
+    client.put(url, json={"title": "T", "description": "D", "priority": 5, "complete": True}, headers=headers)
+    client.put(url, json={"title": "T", "description": "D", "priority": 5, "complete": True}, headers=headers)
+    client.patch(url, json={"priority": 2}, headers=headers)
+    client.patch(url, json={"priority": 2, "complete": False}, headers=headers)
+    client.put("/todos/batch", json=[{"id": todo_id, "title": "T", "description": "D", "priority": 3, "complete": True}] * 2,
+               headers=headers)
+    maintained = client.get("/todos/stats", headers=headers).json()
+    assert maintained["total"] == 1 and maintained["completed"] == 1
+    assert maintained["by_priority"] == {"1": 0, "2": 0, "3": 1, "4": 0, "5": 0}
+
+    counters.rebuild(db_session)
+    assert client.get("/todos/stats", headers=headers).json() == maintained
+
+
+def test_batch_create_is_one_insert(client, user_token):
+    """Test a large batch is one INSERT and every id belongs to the item at its index"""
+    headers = get_auth_headers(user_token)
+    new_todos = [{"title": f"Batch {i}", "description": "Synced", "priority": i % 5 + 1} for i in range(300)]
+    with capture_queries() as requests:
+        response = client.post("/todos/batch", json=new_todos, headers=headers)
+    assert response.status_code == status.HTTP_201_CREATED
+    stats = requests[0][2]
+    # the INSERT, the counters upsert and the data version bump
+    assert stats.count <= 3
+    assert sum(count for statement, count in stats.statements.items() if statement.startswith("INSERT INTO \"Todos\"")) == 1
+
+    for result in response.json()["results"][::50]:
+        todo = client.get(f"/todos/{result['id']}", headers=headers).json()
+        assert todo["title"] == f"Batch {result['index']}"
+
+
+def test_todo_stats_follow_writes(client, user_token):
+    """Test counters are maintained by create, update and delete"""
+    headers = get_auth_headers(user_token)
+    first = client.post("/todos", json={"title": "A", "description": "A", "priority": 4}, headers=headers)
+    client.post("/todos", json={"title": "B", "description": "B", "priority": 2}, headers=headers)
+    todo_id = first.json()["todo"]["id"]
+    client.put(f"/todos/{todo_id}", json={"title": "A", "description": "A", "priority": 5, "complete": True},
+               headers=headers)
+
+    stats = client.get("/todos/stats", headers=headers).json()
+    assert (stats["total"], stats["completed"], stats["pending"]) == (2, 1, 1)
+    assert stats["by_priority"] == {"1": 0, "2": 1, "3": 0, "4": 0, "5": 1}
+
+    client.delete(f"/todos/{todo_id}", headers=headers)
+    stats = client.get("/todos/stats", headers=headers).json()
+    assert (stats["total"], stats["completed"], stats["by_priority"]["5"]) == (1, 0, 0)
+
+
+def test_delete_legacy_todo_without_priority(client, db_session, user_token, test_user):
+    """Test a todo with a NULL priority can be deleted without touching the priority counts"""
+    legacy = Todos(title="Old", description="Old", priority=None, complete=False, owner_id=test_user.id)
+    db_session.add(legacy)
+    db_session.commit()
+    headers = get_auth_headers(user_token)
+    client.post("/todos", json={"title": "New", "description": "New", "priority": 3}, headers=headers)
+
+    assert client.delete(f"/todos/{legacy.id}", headers=headers).status_code == status.HTTP_204_NO_CONTENT
+    stats = client.get("/todos/stats", headers=headers).json()
+    assert stats["by_priority"] == {"1": 0, "2": 0, "3": 1, "4": 0, "5": 0}
+
+
+def test_write_other_users_todo_not_found(client, admin_token, test_todo):
+    """Test update and delete keep 404 for todos of another user and leave them untouched"""
+    headers = get_auth_headers(admin_token)
+    update_data = {"title": "Stolen", "description": "Stolen", "priority": 1, "complete": True}
+    assert client.put(f"/todos/{test_todo.id}", json=update_data, headers=headers).status_code == status.HTTP_404_NOT_FOUND
+    assert client.delete(f"/todos/{test_todo.id}", headers=headers).status_code == status.HTTP_404_NOT_FOUND
+    assert client.get("/todos/stats", headers=headers).json()["total"] == 0
+
+
+def test_patch_todo_updates_only_sent_fields(client, user_token, test_todo):
+    """Test PATCH changes the given columns and keeps the rest"""
+    headers = get_auth_headers(user_token)
+    response = client.patch(f"/todos/{test_todo.id}", json={"complete": True}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    todo = response.json()["todo"]
+    assert todo["complete"] is True
+    assert (todo["title"], todo["description"], todo["priority"]) == (test_todo.title, test_todo.description, test_todo.priority)
+
+    assert client.patch(f"/todos/{test_todo.id}", json={}, headers=headers).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert client.patch(f"/todos/{test_todo.id}", json={"title": None}, headers=headers).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert client.patch("/todos/999", json={"priority": 2}, headers=headers).status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_search_todos_ranked_and_scoped(client, user_token, admin_token, db_session, test_user, test_admin):
+    """Test search ranks title matches first, pages with a cursor and only sees the user's todos"""
+    db_session.add_all([
+        Todos(title="Groceries", description="buy milk and bread", priority=1, complete=False, owner_id=test_user.id),
+        Todos(title="Milk run", description="before work", priority=2, complete=False, owner_id=test_user.id),
+        Todos(title="Laundry", description="towels", priority=3, complete=False, owner_id=test_user.id),
+        Todos(title="Milk", description="admin's milk", priority=1, complete=False, owner_id=test_admin.id),
+    ])
+    db_session.commit()
+    headers = get_auth_headers(user_token)
+
+    first = client.get("/todos/search", params={"q": "milk", "limit": 1}, headers=headers)
+    assert first.status_code == status.HTTP_200_OK
+    assert [todo["title"] for todo in first.json()] == ["Milk run"]
+    second = client.get("/todos/search", params={"q": "milk", "limit": 1, "cursor": first.headers["X-Next-Cursor"]},
+                        headers=headers)
+    assert [todo["title"] for todo in second.json()] == ["Groceries"]
+    assert "X-Next-Cursor" not in second.headers
+
+    # edits are indexed, and other users' todos never match
+    todo_id = first.json()[0]["id"]
+    client.patch(f"/todos/{todo_id}", json={"title": "Errand"}, headers=headers)
+    assert [todo["title"] for todo in client.get("/todos/search", params={"q": "errands"}, headers=headers).json()] == ["Errand"]
+    assert client.get("/todos/search", params={"q": "towels"}, headers=get_auth_headers(admin_token)).json() == []
+    assert client.get("/todos/search", params={"q": "?!"}, headers=headers).json() == []
@@ -12,6 +12,16 @@ def test_get_user_info(client, user_token):
     assert response.status_code == status.HTTP_200_OK
 
 
+def test_user_info_body(client, user_token, test_user):
+    """Test the exact user-info JSON, display-style aliases included"""
+    response = client.get("/users/user-info", headers=get_auth_headers(user_token))
+    assert response.headers["content-type"] == "application/json"
+    assert response.text == (
+        f'{{"ID":{test_user.id},"Username":"testuser","Email":"test@example.com","First Name":"Test",'
+        '"Last Name":"User","Status":true,"Role":"user","Phone Number":"1234567890"}'
+    )
+
+
 def test_change_password(client, user_token):
     """Test changing password"""
     headers = get_auth_headers(user_token)
@@ -29,4 +39,16 @@ def test_change_phone_number(client, user_token):
         "/users/change-phone-number?new_phone_number=9876543210",
         headers=headers
     )
-    assert response.status_code == status.HTTP_204_NO_CONTENT
\ No newline at end of file
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+def test_user_info_etag(client, user_token):
+    """Test user info revalidates and changes after a profile write"""
+    headers = get_auth_headers(user_token)
+    etag = client.get("/users/user-info", headers=headers).headers["ETag"]
+    response = client.get("/users/user-info", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    client.post("/users/change-phone-number?new_phone_number=5550000000", headers=headers)
+    response = client.get("/users/user-info", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["Phone Number"] == "5550000000"
@@ -16,18 +16,22 @@ import os
 os.environ["TESTING"] = "1"
 os.environ["SECRET_KEY"] = "test-secret-key-for-testing-only-not-secure"
 os.environ["DATABASE_URL"] = "sqlite:///./test_database.db"
+# app tests hash on the threadpool, the worker pool itself is covered by test_passwords.py
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
 
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, StaticPool
 from sqlalchemy.orm import sessionmaker
-from database import Base, get_db, engine, SessionLocal  # Import the same engine and SessionLocal
+from database import Base, get_db, engine, SessionLocal, AsyncSessionLocal  # Import the same engine and SessionLocal
 from models import Users, Todos
-from passlib.context import CryptContext
+from passwords import bcrypt_context
 from jose import jwt
 from datetime import timedelta, datetime, timezone
 from typing import Optional
 import tempfile
+import cache
+import throttle
 
 # Import main after setting environment
 import main
@@ -35,20 +39,15 @@ import main
 # Use the same database configuration as main app
 TestingSessionLocal = SessionLocal  # Use the same SessionLocal from database.py
 
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
-
 # Test JWT configuration (use environment variable like the main app)
 SECRET_KEY = os.getenv("SECRET_KEY", "test-secret-key-for-testing-only-not-secure")
 ALGORITHM = 'HS256'
 
 
-def override_get_db():
+async def override_get_db():
     """Override database dependency for testing"""
-    try:
-        db = TestingSessionLocal()
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 @pytest.fixture(scope="function")
@@ -72,6 +71,9 @@ def client(db_session):
     """Create a test client with database dependency override"""
     # Override the database dependency
     main.app.dependency_overrides[get_db] = override_get_db
+    # Every test starts with empty in-process caches
+    cache.todo_cache.clear()
+    throttle.clear()
     
     with TestClient(main.app) as test_client:
         yield test_client
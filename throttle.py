@@ -0,0 +1,152 @@
+"""
+Login throttling.
+
+Every ``POST /auth/token`` takes a token from a bucket for the client IP and
+one for the username before anything touches the database or bcrypt. A
+bucket holds ``burst`` tokens and refills at ``rate`` per second; an empty
+bucket answers 429 with Retry-After. Failed logins also count towards a
+lockout: from the ``lockout_threshold``-th failure on, the key is
+refused for ``lockout_base`` seconds, doubling with each further failure up
+to ``lockout_max``. A successful login clears the username's failures, and
+failures older than ``lockout_max`` are forgotten.
+
+State lives in process, in an LRU bounded to ``maxsize`` keys per limiter.
+Evicting a key only forgets its history, so the bound trades a little
+precision under a flood of distinct keys for fixed memory.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from fastapi import HTTPException, status
+
+
+class _State:
+    __slots__ = ('tokens', 'updated', 'failures', 'last_failure', 'locked_until')
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.failures = 0
+        self.last_failure = 0.0
+        self.locked_until = 0.0
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets with failure lockout and LRU eviction."""
+
+    def __init__(self,
+                 rate: float,
+                 burst: int,
+                 lockout_threshold: int,
+                 lockout_base: float,
+                 lockout_max: float,
+                 maxsize: int,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.lockout_threshold = lockout_threshold
+        self.lockout_base = lockout_base
+        self.lockout_max = lockout_max
+        self.maxsize = maxsize
+        self._clock = clock
+        self._states: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, key: str, now: float) -> _State:
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _State(self.burst, now)
+            while len(self._states) > self.maxsize:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(key)
+            state.tokens = min(self.burst, state.tokens + (now - state.updated) * self.rate)
+            state.updated = now
+        return state
+
+    def acquire(self, key: str) -> Optional[float]:
+        """Take a token for ``key``, returns None or the seconds to wait before retrying."""
+        with self._lock:
+            now = self._clock()
+            state = self._state(key, now)
+            if state.locked_until > now:
+                return state.locked_until - now
+            if state.tokens < 1:
+                return (1 - state.tokens) / self.rate if self.rate > 0 else self.lockout_max
+            state.tokens -= 1
+            return None
+
+    def failure(self, key: str):
+        with self._lock:
+            now = self._clock()
+            state = self._state(key, now)
+            # failures older than the longest lockout are forgiven
+            if now - state.last_failure > self.lockout_max:
+                state.failures = 0
+            state.failures += 1
+            state.last_failure = now
+            extra = state.failures - self.lockout_threshold
+            if extra >= 0:
+                state.locked_until = now + min(self.lockout_base * 2 ** extra, self.lockout_max)
+
+    def success(self, key: str):
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                state.failures = 0
+                state.locked_until = 0.0
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+
+def _limiter(prefix: str, rate: str, burst: str, lockout_threshold: str) -> TokenBucketLimiter:
+    return TokenBucketLimiter(
+        rate=float(os.getenv(f"{prefix}_RATE", rate)) / 60,
+        burst=int(os.getenv(f"{prefix}_BURST", burst)),
+        lockout_threshold=int(os.getenv(f"{prefix}_LOCKOUT_THRESHOLD", lockout_threshold)),
+        lockout_base=float(os.getenv("LOGIN_LOCKOUT_BASE", "30")),
+        lockout_max=float(os.getenv("LOGIN_LOCKOUT_MAX", "900")),
+        maxsize=int(os.getenv("LOGIN_THROTTLE_SIZE", "100000")),
+    )
+
+
+#rates are per minute; one IP may front many users (NAT), so it gets more room than a username
+ip_limiter = _limiter("LOGIN_IP", "30", "20", "20")
+username_limiter = _limiter("LOGIN_USERNAME", "5", "5", "5")
+
+
+def _username_key(username: str) -> str:
+    return username.strip().lower()
+
+
+def check_login(ip: str, username: str):
+    """Raise 429 if either the client IP or the username is out of attempts."""
+    for limiter, key in ((ip_limiter, ip), (username_limiter, _username_key(username))):
+        retry_after = limiter.acquire(key)
+        if retry_after is not None:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                detail='Too many login attempts, please retry later',
+                                headers={'Retry-After': str(max(1, int(retry_after + 0.999)))})
+
+
+def record_login(ip: str, username: str, succeeded: bool):
+    # an IP's failures are never cleared early, or one valid account would reset them
+    if succeeded:
+        username_limiter.success(_username_key(username))
+    else:
+        username_limiter.failure(_username_key(username))
+        ip_limiter.failure(ip)
+
+
+def clear():
+    ip_limiter.clear()
+    username_limiter.clear()